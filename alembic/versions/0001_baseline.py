@@ -0,0 +1,60 @@
+"""baseline: tables as created by create_all() before migrations
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_name", "users", ["name"])
+    op.create_index("ix_users_email", "users", ["email"])
+
+    op.create_table(
+        "Booksfastapi",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("Title", sa.String(), nullable=False),
+        sa.Column("Author", sa.String(), nullable=False),
+        sa.Column("published", sa.Boolean(), server_default=sa.true(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("Owners_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["Owners_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_Booksfastapi_id", "Booksfastapi", ["id"])
+    op.create_index("ix_Booksfastapi_Title", "Booksfastapi", ["Title"])
+    op.create_index("ix_Booksfastapi_Author", "Booksfastapi", ["Author"])
+
+    op.create_table(
+        "vote",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("book_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["book_id"], ["Booksfastapi.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "book_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("vote")
+    op.drop_table("Booksfastapi")
+    op.drop_table("users")
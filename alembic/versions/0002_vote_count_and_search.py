@@ -0,0 +1,36 @@
+"""Book.vote_count and the full-text/trigram search indexes
+
+Revision ID: 0002_vote_count_and_search
+Revises: 0001_baseline
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_vote_count_and_search"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("Booksfastapi") as batch:
+        batch.add_column(sa.Column("vote_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute('UPDATE "Booksfastapi" SET vote_count = (SELECT count(*) FROM vote WHERE vote.book_id = "Booksfastapi".id)')
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute('CREATE INDEX ix_books_search ON "Booksfastapi" '
+                   "USING gin (to_tsvector('simple', \"Title\" || ' ' || \"Author\"))")
+        op.execute('CREATE INDEX ix_books_title_trgm ON "Booksfastapi" USING gin ("Title" gin_trgm_ops)')
+        op.execute('CREATE INDEX ix_books_author_trgm ON "Booksfastapi" USING gin ("Author" gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_books_author_trgm", table_name="Booksfastapi")
+        op.drop_index("ix_books_title_trgm", table_name="Booksfastapi")
+        op.drop_index("ix_books_search", table_name="Booksfastapi")
+    with op.batch_alter_table("Booksfastapi") as batch:
+        batch.drop_column("vote_count")
@@ -0,0 +1,28 @@
+"""trending_buckets: checkpointed per-bucket vote counts for the trending leaderboard
+
+Revision ID: 0003_trending_buckets
+Revises: 0002_vote_count_and_search
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_trending_buckets"
+down_revision = "0002_vote_count_and_search"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "trending_buckets",
+        sa.Column("bucket", sa.Integer(), nullable=False),
+        sa.Column("book_id", sa.Integer(), nullable=False),
+        sa.Column("votes", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("bucket", "book_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("trending_buckets")
@@ -0,0 +1,39 @@
+"""user_stats summary table and an index on vote.book_id
+
+Revision ID: 0004_user_stats
+Revises: 0003_trending_buckets
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_user_stats"
+down_revision = "0003_trending_buckets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_vote_book_id", "vote", ["book_id"])
+    op.create_table(
+        "user_stats",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("books", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("published", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("votes_received", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("top_book_id", sa.Integer(), nullable=True),
+        sa.Column("top_book_votes", sa.Integer(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    # The most-voted book is left NULL and computed on first read
+    op.execute('INSERT INTO user_stats (user_id, books, published, votes_received) '
+               'SELECT b."Owners_id", count(*), sum(CASE WHEN b.published THEN 1 ELSE 0 END), coalesce(sum(v.n), 0) '
+               'FROM "Booksfastapi" b LEFT JOIN (SELECT book_id, count(*) AS n FROM vote GROUP BY book_id) v '
+               'ON v.book_id = b.id GROUP BY b."Owners_id"')
+
+
+def downgrade():
+    op.drop_table("user_stats")
+    op.drop_index("ix_vote_book_id", table_name="vote")
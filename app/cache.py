@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from fastapi import HTTPException, Request, Response, status
+from .config import settings
+from .hub import json_batches
+from .serializers import dumps
+
+logger = logging.getLogger(__name__)
+
+CACHE_CHANNEL = "cache"
+
+
+class MemoryBackend:
+    shared = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def delete_prefix(self, prefix: str):
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+
+class RedisBackend:
+    # Any redis.asyncio compatible client works, e.g. fakeredis.aioredis.FakeRedis locally
+    shared = True
+
+    def __init__(self, client, namespace: str = "bookfastapi:"):
+        self.client = client
+        self.namespace = namespace
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.namespace + key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.client.set(self.namespace + key, value, ex=ttl)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*[self.namespace + key for key in keys])
+
+    async def delete_prefix(self, prefix: str):
+        keys = [key async for key in self.client.scan_iter(match=self.namespace + prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+
+
+class CacheEntry:
+    def __init__(self, etag: str, body: bytes):
+        self.etag = etag
+        self.body = body
+
+    @classmethod
+    def build(cls, data) -> "CacheEntry":
+        body = dumps(data)
+        return cls('"' + hashlib.sha1(body).hexdigest() + '"', body)
+
+    @classmethod
+    def decode(cls, value: bytes) -> "CacheEntry":
+        etag, body = value.split(b"\n", 1)
+        return cls(etag.decode(), body)
+
+    def encode(self) -> bytes:
+        return self.etag.encode() + b"\n" + self.body
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or
+                              self.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    # Invalidations travel through the hub broker, so every worker drops its copy of a
+    # memory-backed entry and bumps its generation. Loaders should read the primary: an
+    # entry is served to everyone for the TTL, and one filled from a replica that has not
+    # replayed the invalidating write yet would stay stale for that long.
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight = {}
+        self._generation = 0
+        self._hub = None
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable]) -> Optional[CacheEntry]:
+        value = await self.backend.get(key)
+        if value is not None:
+            return CacheEntry.decode(value)
+
+        # Single flight: concurrent misses on the same key wait for one loader
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except Exception:
+                return await self._load(key, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._load(key, loader)
+        except BaseException as e:
+            future.set_exception(RuntimeError(f"Loading {key} failed"))
+            future.exception()
+            raise
+        else:
+            future.set_result(entry)
+            return entry
+        finally:
+            del self._inflight[key]
+
+    async def _load(self, key: str, loader) -> Optional[CacheEntry]:
+        generation = self._generation
+        data = await loader()
+        if data is None:
+            return None
+        entry = CacheEntry.build(data)
+        # Skip the store if an invalidation happened while loading, the row may already be stale
+        if generation == self._generation:
+            await self.backend.set(key, entry.encode(), self.ttl)
+        return entry
+
+    async def respond(self, request: Request, key: str, loader, not_found: str) -> Response:
+        entry = await self.get_or_load(key, loader)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        return entry.response(request)
+
+    async def invalidate(self, *keys: str):
+        self._generation += 1
+        await self.backend.delete(*keys)
+        await self._broadcast([["key", key] for key in keys])
+
+    async def invalidate_prefix(self, prefix: str):
+        self._generation += 1
+        await self.backend.delete_prefix(prefix)
+        await self._broadcast([["prefix", prefix]])
+
+    async def _broadcast(self, items):
+        if self._hub is None:
+            return
+        for message in json_batches(items):
+            try:
+                await self._hub.broker.publish(CACHE_CHANNEL, message)
+            except Exception:
+                logger.exception("Failed to publish cache invalidation")
+
+    def receive(self, message: str):
+        # Another worker's invalidation, or this worker's own coming back from the broker
+        self._generation += 1
+        if self.backend.shared:
+            return
+        for kind, value in json.loads(message):
+            if kind == "prefix":
+                asyncio.create_task(self.backend.delete_prefix(value))
+            else:
+                asyncio.create_task(self.backend.delete(value))
+
+    def start(self, hub):
+        self._hub = hub
+        hub.subscribe(CACHE_CHANNEL, self.receive)
+
+
+def build_cache() -> ResponseCache:
+    if settings.cache_backend == "redis":
+        import redis.asyncio as redis
+        backend = RedisBackend(redis.from_url(settings.cache_url))
+    else:
+        backend = MemoryBackend(settings.cache_max_entries)
+    return ResponseCache(backend, settings.cache_ttl)
+
+
+cache = build_cache()
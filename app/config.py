@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     database_host: str
@@ -6,9 +7,75 @@ class Settings(BaseSettings):
     database_username: str
     database_password: str
     database_name: str
+    database_url: Optional[str] = None
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    database_replica_urls: List[str] = []
+    replica_strategy: str = "round_robin"
+    replica_read_your_writes: float = 5.0
+    replica_health_interval: float = 5.0
+    replica_health_timeout: float = 2.0
+    replica_max_lag: float = 10.0
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    token_cache_size: int = 10000
+    token_cache_ttl: int = 300
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 10.0
+    jwt_keys_dir: Optional[str] = None
+    jwt_signing_kid: Optional[str] = None
+    vote_flush_interval: float = 1.0
+    vote_flush_threshold: int = 500
+    vote_reconcile_interval: int = 3600
+    vote_batch_max: int = 500
+    batch_get_max: int = 100
+    password_workers: int = 2
+    password_max_pending: int = 64
+    bulk_import_chunk_size: int = 5000
+    bulk_import_use_copy: bool = True
+    cache_backend: str = "memory"
+    cache_url: Optional[str] = None
+    cache_ttl: int = 30
+    cache_max_entries: int = 10000
+    hub_backend: str = "memory"
+    hub_url: Optional[str] = None
+    hub_queue_size: int = 64
+    chat_max_message_bytes: int = 4096
+    vote_feed_max_rate: float = 2.0
+    vote_feed_buffer_size: int = 1000
+    books_page_ttl: float = 5.0
+    books_page_size: int = 20
+    metrics_enabled: bool = False
+    slow_query_ms: float = 200.0
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: Optional[int] = None
+    graceful_timeout: float = 30.0
+    worker_ready_timeout: float = 60.0
+    warmup_connections: Optional[int] = None
+    trending_bucket_seconds: int = 300
+    trending_capacity: int = 100
+    trending_checkpoint_interval: float = 60.0
+    export_batch_size: int = 10000
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_url: Optional[str] = None
+    rate_limit_max_keys: int = 100000
+    rate_limit_trust_forwarded: bool = False
+    # "<requests>/<seconds>" per route; a route without an entry is not limited
+    rate_limits: Dict[str, str] = {
+        "login": "10/60",
+        "register": "5/60",
+        "vote": "60/10",
+        "vote_batch": "10/10",
+        "import": "5/60",
+        "export": "5/60",
+    }
 
     class Config:
         env_file = '.env'
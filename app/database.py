@@ -1,15 +1,52 @@
 # database.py
+import hashlib
+from typing import Optional
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.requests import HTTPConnection
 from .config import settings
+from .metrics import TimedAsyncQueuePool, TimedQueuePool
 
 
-SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_host}:{settings.database_port}/{settings.database_name}'
+SQLALCHEMY_DATABASE_URL = settings.database_url or f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_host}:{settings.database_port}/{settings.database_name}'
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+def async_url(url: str):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url.set(drivername="postgresql+asyncpg") \
+        .update_query_dict({"prepared_statement_cache_size": str(settings.db_statement_cache_size)})
+
+
+def pool_options(url):
+    # SQLite stand-ins use SQLAlchemy's default single-file pools, which take no sizing arguments
+    url = make_url(str(url))
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if settings.metrics_enabled:
+        options["poolclass"] = TimedAsyncQueuePool if url.get_dialect().is_async else TimedQueuePool
+    return options
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = async_url(SQLALCHEMY_DATABASE_URL)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **pool_options(ASYNC_SQLALCHEMY_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -18,3 +55,24 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def writer_key(connection: HTTPConnection) -> Optional[bytes]:
+    # Identifies "the same user" for read-your-writes routing without decoding the token
+    authorization = connection.headers.get("authorization")
+    return hashlib.sha256(authorization.encode()).digest() if authorization else None
+
+
+async def get_async_db(connection: HTTPConnection):
+    async with AsyncSessionLocal() as db:
+        db.info["writer"] = writer_key(connection)
+        yield db
+
+
+def dialect_insert(db, table):
+    # INSERT ... ON CONFLICT is dialect specific; SQLite is only used as a local stand-in
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(table)
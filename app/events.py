@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Optional
+from .config import settings
+from .hub import json_batches
+
+VOTE_COUNTS_CHANNEL = "vote_counts"
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class VoteFeed:
+    # Vote count changes arrive from the VoteCounter flush (already coalesced per
+    # book) through the hub broker, so every worker sees every change. Each book
+    # emits at most max_rate events per second; in between, only its latest count
+    # is kept. Recent events stay in a ring buffer for Last-Event-ID resumes.
+    #
+    # Event ids are assigned once, by the worker that publishes the change, and travel
+    # with it, so every worker knows the same change by the same id and a client can
+    # resume on any of them.
+    def __init__(self, max_rate: float, buffer_size: int):
+        self.min_interval = 1.0 / max_rate
+        self.events = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._last_emit = {}
+        self._pending = {}
+        self._latest = {}
+        self._last_id = 0
+        self._emitted = 0
+        self._loop = None
+
+    def start(self, hub, vote_counter):
+        self._loop = asyncio.get_running_loop()
+        hub.subscribe(VOTE_COUNTS_CHANNEL, self.receive)
+
+        def publish(counts):
+            # Called from the vote counter thread, after a flush or a reconcile
+            events = [[book_id, vote_count, self._next_id()] for book_id, vote_count in counts]
+            for message in json_batches(events):
+                asyncio.run_coroutine_threadsafe(hub.broker.publish(VOTE_COUNTS_CHANNEL, message), self._loop)
+
+        vote_counter.listeners.append(publish)
+
+    def _next_id(self) -> int:
+        # Microsecond timestamps keep ids from different workers ordered and apart
+        self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+        return self._last_id
+
+    def receive(self, message: str):
+        for book_id, vote_count, event_id in json.loads(message):
+            # Two workers' changes to one book can arrive out of order; keep the newer
+            if event_id > self._latest.get(book_id, 0):
+                self._latest[book_id] = event_id
+                self._offer(book_id, vote_count, event_id)
+
+    def _offer(self, book_id: int, vote_count: int, event_id: int):
+        wait = self._last_emit.get(book_id, 0) + self.min_interval - time.monotonic()
+        if wait <= 0:
+            self._emit(book_id, vote_count, event_id)
+            return
+        if book_id not in self._pending:
+            self._loop.call_later(wait, self._emit_pending, book_id)
+        self._pending[book_id] = (vote_count, event_id)
+
+    def _emit_pending(self, book_id: int):
+        pending = self._pending.pop(book_id, None)
+        if pending is not None:
+            self._emit(book_id, *pending)
+
+    def _emit(self, book_id: int, vote_count: int, event_id: int):
+        self._last_emit[book_id] = time.monotonic()
+        event = (event_id, json.dumps({"book_id": book_id, "vote_count": vote_count}))
+        self.events.append(event)
+        self._emitted += 1
+        if self._emitted % self.events.maxlen == 0:
+            self._prune()
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind: end this stream, the client resumes from the ring buffer
+                self._subscribers.discard(queue)
+
+    def _prune(self):
+        # Once per ring buffer's worth of events: forget books whose newest change has
+        # left the buffer and throttles that have expired, or both maps grow with every
+        # book ever voted on
+        oldest = self.events[0][0]
+        self._latest = {book_id: event_id for book_id, event_id in self._latest.items()
+                        if event_id >= oldest or book_id in self._pending}
+        cutoff = time.monotonic() - self.min_interval
+        self._last_emit = {book_id: emitted for book_id, emitted in self._last_emit.items() if emitted > cutoff}
+
+    async def stream(self, last_event_id: Optional[int]):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            # A throttled book's event goes out after newer events of other books, so ids
+            # are not emitted in order: replay what followed the client's last event here,
+            # or everything newer if it came from another worker or left the buffer
+            replayed = set()
+            if last_event_id is not None:
+                backlog = list(self.events)
+                ids = [event_id for event_id, _ in backlog]
+                if last_event_id in ids:
+                    backlog = backlog[ids.index(last_event_id) + 1:]
+                else:
+                    backlog = [event for event in backlog if event[0] > last_event_id]
+                for event_id, data in backlog:
+                    yield f"id: {event_id}\ndata: {data}\n\n"
+                    replayed.add(event_id)
+            while queue in self._subscribers or not queue.empty():
+                try:
+                    event_id, data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event_id not in replayed:
+                    yield f"id: {event_id}\ndata: {data}\n\n"
+        finally:
+            self._subscribers.discard(queue)
+
+
+vote_feed = VoteFeed(settings.vote_feed_max_rate, settings.vote_feed_buffer_size)
@@ -0,0 +1,192 @@
+import argparse
+import csv
+import io
+import sys
+import zlib
+from sqlalchemy import Boolean, DateTime, Integer, select
+from . import models
+from .config import settings
+
+# Full-table dumps for analytics. Rows come from a server-side cursor in
+# export_batch_size partitions and each partition is encoded and handed on before
+# the next is fetched, so memory stays flat however large the table is.
+EXPORTS = {
+    "books": (models.Book.id, models.Book.Title, models.Book.Author, models.Book.published,
+              models.Book.created_at, models.Book.Owners_id, models.Book.vote_count),
+    # Any logged-in user may export, so no email addresses
+    "users": (models.users.id, models.users.name, models.users.created_at),
+    "votes": (models.vote.user_id, models.vote.book_id, models.vote.created_at),
+}
+ORDER = {
+    "books": (models.Book.id,),
+    "users": (models.users.id,),
+    "votes": (models.vote.user_id, models.vote.book_id),
+}
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def export_query(table: str):
+    return select(*EXPORTS[table]).order_by(*ORDER[table])
+
+
+class CsvEncoder:
+    def __init__(self, columns, compress: bool = False):
+        self.media_type = "application/gzip" if compress else "text/csv"
+        self.extension = "csv.gz" if compress else "csv"
+        self._columns = [column.key for column in columns]
+        self._timestamps = [index for index, column in enumerate(columns) if isinstance(column.type, DateTime)]
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        # wbits=31: a gzip stream, compressed incrementally
+        self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return self._gzip.compress(data) if self._gzip else data
+
+    def begin(self) -> bytes:
+        self._writer.writerow(self._columns)
+        return self._drain()
+
+    def write(self, rows) -> bytes:
+        if self._timestamps:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for index in self._timestamps:
+                    if row[index] is not None:
+                        row[index] = row[index].isoformat()
+        self._writer.writerows(rows)
+        return self._drain()
+
+    def finish(self) -> bytes:
+        return self._drain() + (self._gzip.flush() if self._gzip else b"")
+
+
+class _Sink:
+    # Write-only file object the Arrow writers flush into; drained after every batch
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArrowEncoder:
+    # Arrow IPC stream or Parquet, zstd compressed; one record batch / row group per partition
+    def __init__(self, columns, fmt: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportUnavailable(f"{fmt} export needs pyarrow installed")
+        self._pa = pa
+        self.extension = fmt
+        self.media_type = "application/vnd.apache.parquet" if fmt == "parquet" else "application/vnd.apache.arrow.stream"
+        types = {Integer: pa.int64(), Boolean: pa.bool_(), DateTime: pa.timestamp("us", tz="UTC")}
+        self.schema = pa.schema([(column.key, next((arrow_type for sql_type, arrow_type in types.items()
+                                                    if isinstance(column.type, sql_type)), pa.string()))
+                                 for column in columns])
+        self._sink = _Sink()
+        file = pa.PythonFile(self._sink, mode="w")
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(file, self.schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(file, self.schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+    def begin(self) -> bytes:
+        return self._sink.drain()
+
+    def write(self, rows) -> bytes:
+        if rows:
+            arrays = [self._pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+            self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+FORMATS = ("csv", "csv.gz", "arrow", "parquet")
+
+
+def build_encoder(fmt: str, columns):
+    if fmt in ("csv", "csv.gz"):
+        return CsvEncoder(columns, compress=fmt == "csv.gz")
+    if fmt in ("arrow", "parquet"):
+        return ArrowEncoder(columns, fmt)
+    raise ValueError(f"Unknown export format {fmt!r}")
+
+
+async def stream_export(table: str, encoder, batch_size: int):
+    # Owns its session for the lifetime of the download, like the NDJSON book stream
+    from .replicas import replica_set
+    yield encoder.begin()
+    async with replica_set.session() as db:
+        result = await db.stream(export_query(table).execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            chunk = encoder.write(partition)
+            if chunk:
+                yield chunk
+    yield encoder.finish()
+
+
+def export_to_file(bind, table: str, fmt: str, out, batch_size: int) -> int:
+    encoder = build_encoder(fmt, EXPORTS[table])
+    exported = 0
+    out.write(encoder.begin())
+    with bind.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(export_query(table))
+        for partition in result.partitions():
+            out.write(encoder.write(partition))
+            exported += len(partition)
+    out.write(encoder.finish())
+    return exported
+
+
+if __name__ == "__main__":
+    # python -m app.exports books --format parquet --output books.parquet
+    parser = argparse.ArgumentParser(prog="python -m app.exports")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", default="-", help="file to write, - for stdout")
+    parser.add_argument("--batch-size", type=int, default=settings.export_batch_size)
+    args = parser.parse_args()
+
+    from .database import engine
+    try:
+        if args.output == "-":
+            count = export_to_file(engine, args.table, args.format, sys.stdout.buffer, args.batch_size)
+        else:
+            with open(args.output, "wb") as out:
+                count = export_to_file(engine, args.table, args.format, out, args.batch_size)
+    except ExportUnavailable as e:
+        parser.exit(1, f"{e}\n")
+    print(f"Exported {count} {args.table} rows", file=sys.stderr)
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Iterable, Iterator, Optional
+from fastapi import WebSocket, status
+from sqlalchemy.engine import make_url
+from .config import settings
+from .database import SQLALCHEMY_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Largest message any broker is asked to carry: NOTIFY payloads are limited to 8000 bytes
+# and the channel name and JSON envelope travel with the message.
+MAX_MESSAGE_BYTES = 7000
+
+
+def encoded_size(item) -> int:
+    # Bytes `item` takes in a broker payload: JSON-encoded, then escaped again inside
+    # the JSON envelope that carries the channel name
+    return len(json.dumps(json.dumps(item))) - 2
+
+
+def json_batches(items: Iterable) -> Iterator[str]:
+    # JSON arrays of `items`, each small enough to publish
+    chunk, size = [], 2
+    for item in items:
+        encoded = json.dumps(item)
+        cost = len(json.dumps(encoded)) - 2
+        if chunk and size + cost + 2 > MAX_MESSAGE_BYTES:
+            yield "[" + ", ".join(chunk) + "]"
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += cost + 2
+    if chunk:
+        yield "[" + ", ".join(chunk) + "]"
+
+
+class MemoryBroker:
+    # Single-process broker: publish delivers straight back to this worker
+    async def start(self, on_message: Callable[[str, str], None]):
+        self.on_message = on_message
+
+    async def publish(self, channel: str, message: str):
+        self.on_message(channel, message)
+
+    async def stop(self):
+        pass
+
+
+class RedisBroker:
+    def __init__(self, url: str, namespace: str = "bookfastapi:"):
+        self.url = url
+        self.namespace = namespace
+        self._task = None
+
+    async def start(self, on_message: Callable[[str, str], None]):
+        import redis.asyncio as redis
+        self.client = redis.from_url(self.url)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.psubscribe(self.namespace + "*")
+        self._task = asyncio.create_task(self._read(on_message))
+
+    async def _read(self, on_message):
+        async for message in self.pubsub.listen():
+            if message["type"] == "pmessage":
+                on_message(message["channel"].decode().removeprefix(self.namespace), message["data"].decode())
+
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(self.namespace + channel, message)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await self.pubsub.close()
+            await self.client.close()
+
+
+class PostgresBroker:
+    # LISTEN/NOTIFY on one Postgres channel; the logical channel travels in the payload.
+    # NOTIFY payloads are limited to 8000 bytes.
+    CHANNEL = "bookfastapi_hub"
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._listener = None
+
+    async def start(self, on_message: Callable[[str, str], None]):
+        import asyncpg
+
+        def notify(connection, pid, channel, payload):
+            channel, message = json.loads(payload)
+            on_message(channel, message)
+
+        self._listener = await asyncpg.connect(self.dsn)
+        await self._listener.add_listener(self.CHANNEL, notify)
+        self._publishers = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+
+    async def publish(self, channel: str, message: str):
+        await self._publishers.execute("SELECT pg_notify($1, $2)", self.CHANNEL, json.dumps([channel, message]))
+
+    async def stop(self):
+        if self._listener is not None:
+            await self._listener.close()
+            await self._publishers.close()
+
+
+class Connection:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: Optional[asyncio.Task] = None
+
+    def offer(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send_loop(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await self.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Websocket send failed", exc_info=True)
+
+
+class Hub:
+    # Rooms are local to a worker; every publish goes through the broker so that
+    # sockets held by other uvicorn workers receive it as well. Room messages published
+    # in the same event loop turn are coalesced into one broker message per room.
+    def __init__(self, broker, queue_size: int):
+        self.broker = broker
+        self.queue_size = queue_size
+        self.rooms = defaultdict(set)
+        self.listeners = defaultdict(list)
+        self._outbox = defaultdict(list)
+        self._flushing = None
+
+    async def start(self):
+        await self.broker.start(self.dispatch)
+
+    async def stop(self):
+        await self.broker.stop()
+        for connections in list(self.rooms.values()):
+            for connection in list(connections):
+                connection.sender.cancel()
+
+    async def connect(self, websocket: WebSocket, room: str) -> Connection:
+        await websocket.accept()
+        connection = Connection(websocket, self.queue_size)
+        connection.sender = asyncio.create_task(connection.send_loop())
+        self.rooms[room].add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection, room: str):
+        connections = self.rooms.get(room)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.rooms[room]
+        connection.sender.cancel()
+
+    def publish(self, room: str, message: str):
+        self._outbox[room].append(message)
+        if self._flushing is None:
+            self._flushing = asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flushing = None
+        outbox, self._outbox = self._outbox, defaultdict(list)
+        for room, messages in outbox.items():
+            for batch in json_batches(messages):
+                asyncio.create_task(self._send(f"room:{room}", batch))
+
+    async def _send(self, channel: str, batch: str):
+        try:
+            await self.broker.publish(channel, batch)
+        except Exception:
+            logger.exception("Failed to publish to %s", channel)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        self.listeners[channel].append(callback)
+
+    def dispatch(self, channel: str, message: str):
+        if not channel.startswith("room:"):
+            for callback in self.listeners.get(channel, ()):
+                callback(message)
+            return
+        room = channel.removeprefix("room:")
+        messages = json.loads(message)
+        # Enqueue without awaiting any socket; a consumer whose queue is full is dropped
+        for connection in list(self.rooms.get(room, ())):
+            if not all(connection.offer(text) for text in messages):
+                logger.info("Dropping slow websocket consumer in room %s", room)
+                self.disconnect(connection, room)
+                asyncio.create_task(connection.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER))
+
+
+def build_broker():
+    if settings.hub_backend == "redis":
+        return RedisBroker(settings.hub_url)
+    if settings.hub_backend == "postgres":
+        dsn = settings.hub_url or make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql") \
+            .render_as_string(hide_password=False)
+        return PostgresBroker(dsn)
+    return MemoryBroker()
+
+
+hub = Hub(build_broker(), settings.hub_queue_size)
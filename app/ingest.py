@@ -0,0 +1,225 @@
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, user_stats
+from .config import settings
+from .database import AsyncSessionLocal
+from .rendering import renderer
+from .search import search_index
+
+logger = logging.getLogger(__name__)
+
+BOOK_COLUMNS = ["Title", "Author", "published", "created_at", "Owners_id"]
+MAX_JOBS = 200
+# Uploads above this are spooled to disk while they wait for the import task
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+class ImportJob:
+    def __init__(self, owner_id: int):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.status = "running"
+        self.rows_imported = 0
+        self.rows_rejected = 0
+        self.chunks = []
+        self.started_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+
+    def summary(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "rows_imported": self.rows_imported,
+            "rows_rejected": self.rows_rejected,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "chunks": self.chunks,
+        }
+
+
+jobs = OrderedDict()
+
+
+def new_job(owner_id: int) -> ImportJob:
+    job = ImportJob(owner_id)
+    jobs[job.id] = job
+    # Forget the oldest finished jobs; running ones are kept so progress stays visible
+    for job_id in [j.id for j in jobs.values() if j.status != "running"][:max(0, len(jobs) - MAX_JOBS)]:
+        del jobs[job_id]
+    return job
+
+
+def running_jobs():
+    return [job for job in jobs.values() if job.status == "running"]
+
+
+async def wait_for_running_jobs(timeout: float):
+    deadline = time.monotonic() + timeout
+    while running_jobs() and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+
+async def _lines(body: AsyncIterator[bytes]):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for data in body:
+        buffer += decoder.decode(data)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def records(body: AsyncIterator[bytes], fmt: str):
+    # Yields (line number, record or parse error); CSV fields must not contain newlines
+    header = None
+    line_no = 0
+    async for line in _lines(body):
+        line_no += 1
+        line = line.rstrip("\r")
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            try:
+                values = next(csv.reader([line]))
+            except csv.Error as e:
+                yield line_no, e
+                continue
+            if header is None:
+                header = values
+                continue
+            yield line_no, dict(zip(header, values))
+        else:
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+
+
+def _validate(chunk, owner_id: int):
+    rows, errors = [], []
+    for line_no, record in chunk:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            book = schemas.BookCreate.model_validate(record)
+        except (ValueError, ValidationError, csv.Error) as e:
+            errors.append({"line": line_no, "error": str(e)})
+            continue
+        rows.append({
+            "Title": book.Title,
+            "Author": book.Author,
+            "published": book.published,
+            "created_at": book.created_at or datetime.utcnow(),
+            "Owners_id": owner_id,
+        })
+    return rows, errors
+
+
+async def _copy_rows(db: AsyncSession, rows):
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        models.Book.__tablename__, columns=BOOK_COLUMNS,
+        records=[tuple(row[column] for column in BOOK_COLUMNS) for row in rows])
+
+
+async def _write_rows(db: AsyncSession, rows):
+    if settings.bulk_import_use_copy and db.get_bind().dialect.driver == "asyncpg":
+        await _copy_rows(db, rows)
+    else:
+        stmt = insert(models.Book)
+        if search_index.enabled:
+            created = (await db.execute(stmt.returning(models.Book.id, models.Book.Title, models.Book.Author), rows)).all()
+            for book in created:
+                search_index.add(book.id, book.Title, book.Author)
+        else:
+            await db.execute(stmt, rows)
+
+
+async def _import_chunk(db: AsyncSession, job: ImportJob, chunk):
+    rows, errors = _validate(chunk, job.owner_id)
+    result = {"chunk": len(job.chunks), "first_line": chunk[0][0], "last_line": chunk[-1][0],
+              "imported": 0, "rejected": len(errors), "errors": errors[:20]}
+    if rows:
+        try:
+            await _write_rows(db, rows)
+            await user_stats.books_added(db, job.owner_id, len(rows), sum(row["published"] for row in rows))
+            await db.commit()
+            result["imported"] = len(rows)
+        except Exception as e:
+            await db.rollback()
+            result["rejected"] += len(rows)
+            result["errors"].append({"error": f"Chunk not written: {e}"})
+    job.rows_imported += result["imported"]
+    job.rows_rejected += result["rejected"]
+    job.chunks.append(result)
+
+
+async def import_books(db: AsyncSession, job: ImportJob, body: AsyncIterator[bytes], fmt: str):
+    chunk_size = settings.bulk_import_chunk_size
+    chunk = []
+    try:
+        async for item in records(body, fmt):
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                await _import_chunk(db, job, chunk)
+                chunk = []
+        if chunk:
+            await _import_chunk(db, job, chunk)
+        job.status = "done"
+    except BaseException as e:
+        job.status = "failed"
+        job.error = str(e) or type(e).__name__
+        raise
+    finally:
+        job.finished_at = datetime.utcnow()
+    return job
+
+
+async def spool(body: AsyncIterator[bytes]):
+    # The request body can only be read while the request is open, so it is copied out
+    # before the response and imported from the copy
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    async for data in body:
+        await asyncio.to_thread(file.write, data)
+    await asyncio.to_thread(file.seek, 0)
+    return file
+
+
+async def _read(file):
+    while True:
+        data = await asyncio.to_thread(file.read, READ_SIZE)
+        if not data:
+            return
+        yield data
+
+
+async def run_import(job: ImportJob, file, fmt: str):
+    # Runs after the 202 response with its own session; progress is read from the job
+    try:
+        async with AsyncSessionLocal() as db:
+            await import_books(db, job, _read(file), fmt)
+    except Exception:
+        logger.exception("Import job %s failed", job.id)
+    finally:
+        file.close()
+        if job.rows_imported:
+            renderer.invalidate_books()
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .replicas import get_read_db
+
+BatchFunction = Callable[[AsyncSession, List[Hashable]], Awaitable[Dict[Hashable, object]]]
+
+# name -> async fn(db, keys) returning {key: value} for the keys that exist
+BATCH_FUNCTIONS: Dict[str, BatchFunction] = {}
+
+
+def batch_loader(name: str):
+    def register(fn: BatchFunction) -> BatchFunction:
+        BATCH_FUNCTIONS[name] = fn
+        return fn
+    return register
+
+
+class DataLoader:
+    # Every load() issued before the event loop gets back to this loader is answered by a
+    # single batch call (split at max_batch_size); results are memoised per key, so each
+    # id is fetched at most once for the lifetime of the loader.
+    def __init__(self, batch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, object]]], max_batch_size: int):
+        self._batch = batch
+        self.max_batch_size = max_batch_size
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+
+    def load(self, key: Hashable) -> "asyncio.Future":
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[object]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: Hashable, value):
+        if key not in self._futures:
+            future = self._futures[key] = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+
+    def clear(self, key: Hashable):
+        self._futures.pop(key, None)
+
+    def _dispatch(self):
+        queue, self._queue = self._queue, []
+        for start in range(0, len(queue), self.max_batch_size):
+            asyncio.create_task(self._run(queue[start:start + self.max_batch_size]))
+
+    async def _run(self, keys: List[Hashable]):
+        try:
+            found = await self._batch(keys)
+        except Exception as e:
+            for key in keys:
+                self._futures.pop(key).set_exception(e)
+            return
+        for key in keys:
+            self._futures[key].set_result(found.get(key))
+
+
+class Loaders:
+    # One DataLoader per registered batch function, created on first use. They share the
+    # request's session, which must not run two queries at once, hence the lock.
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._lock = asyncio.Lock()
+        self._loaders: Dict[str, DataLoader] = {}
+
+    def __getitem__(self, name: str) -> DataLoader:
+        loader = self._loaders.get(name)
+        if loader is None:
+            fn = BATCH_FUNCTIONS[name]
+
+            async def batch(keys):
+                async with self._lock:
+                    return await fn(self.db, keys)
+
+            loader = self._loaders[name] = DataLoader(batch, settings.batch_get_max)
+        return loader
+
+
+async def get_loaders(db: AsyncSession = Depends(get_read_db)) -> Loaders:
+    # FastAPI resolves a dependency once per request, so every handler dependency asking
+    # for loaders in the same request shares these
+    return Loaders(db)
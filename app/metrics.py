@@ -0,0 +1,195 @@
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "sql_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # Starlette's router stores the matched route in the (shared) scope once routing is done
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = {}
+        self.request_queries = {}
+        self.query_latency = {}
+        self.slow_queries = {}
+        self.pool_wait = {}
+        self.engines = {}
+
+    def _histogram(self, family: dict, key, buckets):
+        histogram = family.get(key)
+        if histogram is None:
+            histogram = family[key] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            self._histogram(self.request_latency, (method, route, status_code), LATENCY_BUCKETS).observe(seconds)
+            self._histogram(self.request_queries, (method, route), COUNT_BUCKETS).observe(stats.queries)
+
+    def observe_query(self, route: str, seconds: float, statement: str):
+        with self._lock:
+            self._histogram(self.query_latency, route, LATENCY_BUCKETS).observe(seconds)
+            if seconds * 1000 >= settings.slow_query_ms:
+                self.slow_queries[route] = self.slow_queries.get(route, 0) + 1
+            else:
+                return
+        logger.warning("Slow query (%.1f ms) on %s: %s", seconds * 1000, route, " ".join(statement.split())[:1000])
+
+    def observe_pool_wait(self, pool: str, seconds: float):
+        with self._lock:
+            self._histogram(self.pool_wait, pool, LATENCY_BUCKETS).observe(seconds)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route, code), histogram in self.request_latency.items():
+                lines += histogram.render("http_request_duration_seconds",
+                                          f'method="{method}",route="{route}",status="{code}"')
+            lines.append("# TYPE http_request_sql_queries histogram")
+            for (method, route), histogram in self.request_queries.items():
+                lines += histogram.render("http_request_sql_queries", f'method="{method}",route="{route}"')
+            lines.append("# TYPE sql_query_duration_seconds histogram")
+            for route, histogram in self.query_latency.items():
+                lines += histogram.render("sql_query_duration_seconds", f'route="{route}"')
+            lines.append("# TYPE sql_slow_queries_total counter")
+            for route, count in self.slow_queries.items():
+                lines.append(f'sql_slow_queries_total{{route="{route}"}} {count}')
+            lines.append("# TYPE db_pool_checkout_wait_seconds histogram")
+            for pool, histogram in self.pool_wait.items():
+                lines += histogram.render("db_pool_checkout_wait_seconds", f'pool="{pool}"')
+
+        lines.append("# TYPE db_pool_connections gauge")
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                lines.append(f'db_pool_connections{{pool="{name}",state="checked_out"}} {pool.checkedout()}')
+                lines.append(f'db_pool_connections{{pool="{name}",state="idle"}} {pool.checkedin()}')
+                lines.append(f'db_pool_connections{{pool="{name}",state="overflow"}} {max(pool.overflow(), 0)}')
+
+        from anyio import to_thread
+        limiter = to_thread.current_default_thread_limiter()
+        lines.append("# TYPE threadpool_threads gauge")
+        lines.append(f'threadpool_threads{{state="busy"}} {limiter.borrowed_tokens}')
+        lines.append(f'threadpool_threads{{state="limit"}} {limiter.total_tokens}')
+        lines.append(f'threadpool_threads{{state="waiting"}} {limiter.statistics().tasks_waiting}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class TimedQueuePool(QueuePool):
+    # _do_get is where QueuePool blocks waiting for a free connection
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool_wait("sync", time.perf_counter() - start)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool_wait("async", time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+    metrics.observe_query(stats.route if stats is not None else "background", seconds, statement)
+
+
+def instrument_engine(name: str, engine):
+    metrics.engines[name] = engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: no per-request task or body buffering like BaseHTTPMiddleware
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.observe_request(scope["method"], stats.route, status_code, time.perf_counter() - start, stats)
+            current_request.reset(token)
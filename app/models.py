@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP, text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP, text, ForeignKey, func, true, Index, DDL, event, literal_column
 from .database import Base
 from sqlalchemy.orm import relationship
 
@@ -8,11 +8,24 @@ class Book(Base):
     id = Column(Integer, primary_key=True, index=True)
     Title = Column(String, index=True, nullable=False)
     Author = Column(String, index=True, nullable=False)
-    published = Column(Boolean, server_default='True', nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), nullable=False)
+    published = Column(Boolean, server_default=true(), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     Owners_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    vote_count = Column(Integer, server_default='0', nullable=False)
     Owners = relationship("users")
-    votes = relationship("vote", back_populates="book")
+    # vote.book_id is ON DELETE CASCADE; the database removes the votes with the book
+    votes = relationship("vote", back_populates="book", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Full-text and trigram indexes backing /books/search; other databases use app.search.InvertedIndex
+    __table_args__ = (
+        Index("ix_books_search",
+              func.to_tsvector(literal_column("'simple'"), Title + literal_column("' '") + Author),
+              postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index("ix_books_title_trgm", Title, postgresql_using="gin",
+              postgresql_ops={"Title": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_books_author_trgm", Author, postgresql_using="gin",
+              postgresql_ops={"Author": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
     
 
 class users(Base):
@@ -22,13 +35,39 @@ class users(Base):
     name = Column(String, index=True, nullable=False)
     email = Column(String, index=True, nullable=False)
     password = Column(String, nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
 
 class vote(Base):
     __tablename__ = "vote" 
     user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"),primary_key=True)
     book_id = Column(Integer, ForeignKey('Booksfastapi.id', ondelete="CASCADE"),primary_key=True)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     user = relationship("users")
-    book = relationship("Book", back_populates="votes") 
+    book = relationship("Book", back_populates="votes")
+
+    __table_args__ = (Index("ix_vote_book_id", book_id),)
+
+
+class TrendingBucket(Base):
+    # Checkpointed per-bucket vote counts for app.trending. No foreign key: rows of
+    # deleted books just age out with their bucket.
+    __tablename__ = "trending_buckets"
+    bucket = Column(Integer, primary_key=True)
+    book_id = Column(Integer, primary_key=True)
+    votes = Column(Integer, nullable=False)
+
+
+class UserStats(Base):
+    # Per-user library summary kept up to date by app.user_stats
+    __tablename__ = "user_stats"
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    books = Column(Integer, server_default='0', nullable=False)
+    published = Column(Integer, server_default='0', nullable=False)
+    votes_received = Column(Integer, server_default='0', nullable=False)
+    top_book_id = Column(Integer, nullable=True)
+    top_book_votes = Column(Integer, server_default='0', nullable=False)
+
+
+event.listen(Base.metadata, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
@@ -1,10 +1,21 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from . import schemas, models
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from .config import settings
+from .database import get_async_db
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login_new")
 
@@ -14,25 +25,232 @@ ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
 
+TOKEN_REVOKED_CHANNEL = "token_revoked"
+
+
+class TokenCache:
+    # Verified tokens keyed by sha256 digest, so raw bearer tokens are never kept in memory.
+    # Revocations are announced through the hub and kept until the token expires; they
+    # live in memory, so a worker started afterwards does not know them.
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._hub = None
+
+    def get(self, digest: bytes):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            token_data, expires_at = entry
+            if expires_at <= now:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return token_data
+
+    def put(self, digest: bytes, token_data: schemas.TokenData, exp: float):
+        if self.max_size <= 0:
+            return
+        expires_at = min(exp, time.time() + self.ttl)
+        with self._lock:
+            if digest in self._revoked:
+                return
+            self._entries[digest] = (token_data, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def revoke(self, digest: bytes, exp: float):
+        now = time.time()
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked = {d: e for d, e in self._revoked.items() if e > now}
+            self._revoked[digest] = exp
+
+    def is_revoked(self, digest: bytes) -> bool:
+        with self._lock:
+            return digest in self._revoked
+
+    def evict_user(self, user_id: int):
+        with self._lock:
+            for digest in [d for d, (data, _) in self._entries.items() if data.id == user_id]:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def revoke_everywhere(self, digest: bytes, exp: float):
+        self.revoke(digest, exp)
+        if self._hub is not None:
+            try:
+                await self._hub.broker.publish(TOKEN_REVOKED_CHANNEL, json.dumps([digest.hex(), exp]))
+            except Exception:
+                logger.exception("Failed to announce a revoked token")
+
+    def _token_revoked(self, message: str):
+        digest, exp = json.loads(message)
+        self.revoke(bytes.fromhex(digest), exp)
+
+    def start(self, hub):
+        self._hub = hub
+        hub.subscribe(TOKEN_REVOKED_CHANNEL, self._token_revoked)
+
+
+token_cache = TokenCache(settings.token_cache_size, settings.token_cache_ttl)
+
+
+USER_DELETED_CHANNEL = "user_deleted"
+# What handlers read from the authenticated user; the password hash is never cached
+CACHED_USER_COLUMNS = ("id", "name", "email", "created_at")
+
+
+class UserCache:
+    # Column values of recently authenticated users. Deletions are announced through the
+    # hub so every worker drops the user; the TTL bounds anything the broker misses.
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hub = None
+
+    def get(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def put(self, user_id: int, values: dict):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (values, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def user_deleted(self, user_id: int):
+        self._user_deleted(str(user_id))
+        if self._hub is not None:
+            try:
+                await self._hub.broker.publish(USER_DELETED_CHANNEL, str(user_id))
+            except Exception:
+                logger.exception("Failed to announce deleted user %s", user_id)
+
+    def _user_deleted(self, message: str):
+        self.evict(int(message))
+        token_cache.evict_user(int(message))
+
+    def start(self, hub):
+        self._hub = hub
+        hub.subscribe(USER_DELETED_CHANNEL, self._user_deleted)
+
+
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_ttl)
+
+
+class KeyRing:
+    # Asymmetric keys live in jwt_keys_dir as <kid>.pem (public) and <kid>.key (private).
+    # Verifying nodes only need the public halves; rotating means adding a new kid and
+    # pointing jwt_signing_kid at it while old tokens keep verifying against their kid.
+    def __init__(self, keys_dir: str, signing_kid: str):
+        self.keys_dir = Path(keys_dir)
+        self.signing_kid = signing_kid
+        self._public_keys = {}
+        self._private_key = None
+
+    def signing_key(self):
+        if self._private_key is None:
+            self._private_key = (self.keys_dir / f"{self.signing_kid}.key").read_text()
+        return self._private_key
+
+    def verification_key(self, kid: str):
+        if kid not in self._public_keys:
+            path = self.keys_dir / f"{Path(kid).name}.pem"
+            if not path.is_file():
+                return None
+            self._public_keys[kid] = path.read_text()
+        return self._public_keys[kid]
+
+
+key_ring = KeyRing(settings.jwt_keys_dir, settings.jwt_signing_kid) \
+    if not ALGORITHM.startswith("HS") and settings.jwt_keys_dir else None
+
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    if key_ring is not None:
+        return jwt.encode(to_encode, key_ring.signing_key(), algorithm=ALGORITHM,
+                          headers={"kid": key_ring.signing_kid})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def verify_access_token(token: str) -> dict:
+    if key_ring is None:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    key = key_ring.verification_key(jwt.get_unverified_header(token).get("kid") or "")
+    if key is None:
+        raise JWTError("Unknown signing key")
+    return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+
 def decode_access_token(token: str, credentials_exception):
+    digest = _token_digest(token)
+    token_data = token_cache.get(digest)
+    if token_data is not None:
+        return token_data
+    if token_cache.is_revoked(digest):
+        raise credentials_exception
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = verify_access_token(token)
         id: str = payload.get("user_id")
         if id is None:
             raise credentials_exception
         token_data = schemas.TokenData(id=id)
     except JWTError:
         raise credentials_exception
+    # A token without exp never expires; it is cached for the short TTL like any other
+    token_cache.put(digest, token_data, payload.get("exp") or float("inf"))
     return token_data
 
+
+async def revoke_access_token(token: str):
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return
+    # Without exp the token stays valid, so its revocation is kept for a token lifetime
+    await token_cache.revoke_everywhere(_token_digest(token), exp or time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
 def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,3 +258,31 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     return decode_access_token(token, credentials_exception)
+
+
+def get_cookie_user(request: Request):
+    # For the HTML pages: /login stores the token in an httponly cookie that scripts cannot read
+    token = request.cookies.get("access_token")
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    if not token:
+        raise credentials_exception
+    return decode_access_token(token, credentials_exception)
+
+
+async def get_current_user_row(current_user: schemas.TokenData = Depends(get_current_user),
+                               db: AsyncSession = Depends(get_async_db)) -> models.users:
+    # The authenticated users row, resolved once per request and attached to the request's
+    # session, so relationship loads and db.get() for this user in the handler hit the
+    # identity map instead of the database.
+    values = user_cache.get(current_user.id)
+    if values is not None:
+        user = models.users(**values)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+    user = await db.get(models.users, current_user.id)
+    if user is None:
+        # A valid token for a user that has since been deleted
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
+    user_cache.put(user.id, {key: getattr(user, key) for key in CACHED_USER_COLUMNS})
+    return user
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from . import utils
+from .config import settings
+
+
+class PasswordServiceBusy(Exception):
+    pass
+
+
+class PasswordService:
+    # bcrypt runs in a dedicated process pool so a login spike cannot starve the
+    # AnyIO threadpool shared by every other endpoint. Work beyond max_pending is
+    # rejected up front instead of queueing behind seconds of hashing.
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordServiceBusy()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(utils.hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str):
+        return await self._run(utils.verify_and_update_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_service = PasswordService(settings.password_workers, settings.password_max_pending)
@@ -0,0 +1,141 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+from fastapi import Depends, HTTPException, Request, status
+from . import oauth2, schemas
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Limit:
+    __slots__ = ("burst", "rate")
+
+    def __init__(self, burst: float, rate: float):
+        self.burst = burst
+        self.rate = rate
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit":
+        # "<requests>/<seconds>": a bucket of <requests> tokens that refills fully in <seconds>
+        count, period = spec.split("/")
+        return cls(float(count), float(count) / float(period))
+
+
+class MemoryBuckets:
+    def __init__(self, shards: int = 64, max_keys: int = 100000):
+        # Keys hash to independent shards so threadpool handlers rarely contend on one lock
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        # Returns 0 if the request may proceed, otherwise the seconds until it could
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            state = buckets.get(key)
+            if state is None:
+                tokens = limit.burst
+            else:
+                tokens = min(limit.burst, state[0] + (now - state[1]) * limit.rate)
+                buckets.move_to_end(key)
+            if tokens >= cost:
+                buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                buckets[key] = (tokens, now)
+                wait = (cost - tokens) / limit.rate
+            # The least recently used key is the one most likely to have refilled completely
+            if len(buckets) > self._max_keys_per_shard:
+                buckets.popitem(last=False)
+        return wait
+
+    async def hit(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        return self.take(key, limit, cost)
+
+
+# Refill and take in one round trip; TIME keeps every worker on the Redis clock
+TOKEN_BUCKET_LUA = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local burst, rate, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    # Any redis.asyncio compatible client works, e.g. fakeredis.aioredis.FakeRedis locally
+    def __init__(self, client, namespace: str = "bookfastapi:ratelimit:"):
+        self.namespace = namespace
+        self.script = client.register_script(TOKEN_BUCKET_LUA)
+
+    async def hit(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        return float(await self.script(keys=[self.namespace + key], args=[limit.burst, limit.rate, cost]))
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[str, str], enabled: bool = True):
+        self.backend = backend
+        self.limits = {name: Limit.parse(spec) for name, spec in limits.items()}
+        self.enabled = enabled
+
+    async def check(self, name: str, key: str):
+        limit = self.limits.get(name)
+        if not self.enabled or limit is None:
+            return
+        try:
+            wait = await self.backend.hit(f"{name}:{key}", limit)
+        except Exception:
+            # A shared backend outage should not take the API down with it
+            logger.warning("Rate limit backend failed, allowing request", exc_info=True)
+            return
+        if wait:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded",
+                                headers={"Retry-After": str(math.ceil(wait))})
+
+
+def client_ip(request: Request) -> str:
+    if settings.rate_limit_trust_forwarded:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(name: str, by_user: bool = False):
+    # Route dependency: `dependencies=[rate_limit("vote", by_user=True)]`. Authenticated
+    # limits share get_current_user with the handler, so the token is decoded once.
+    if by_user:
+        async def dependency(current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+            await limiter.check(name, f"user:{current_user.id}")
+    else:
+        async def dependency(request: Request):
+            await limiter.check(name, f"ip:{client_ip(request)}")
+    return Depends(dependency)
+
+
+def build_limiter() -> RateLimiter:
+    if settings.rate_limit_backend == "redis":
+        import redis.asyncio as redis
+        backend = RedisBuckets(redis.from_url(settings.rate_limit_url))
+    else:
+        backend = MemoryBuckets(max_keys=settings.rate_limit_max_keys)
+    return RateLimiter(backend, settings.rate_limits, settings.rate_limit_enabled)
+
+
+limiter = build_limiter()
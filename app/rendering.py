@@ -0,0 +1,117 @@
+import asyncio
+import gzip
+import hashlib
+import html
+import json
+import time
+from pathlib import Path
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from .config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+STATIC_DIR = Path(__file__).parent / "static"
+STATIC_TYPES = {".css": "text/css; charset=utf-8", ".js": "application/javascript; charset=utf-8"}
+
+
+# The books page is recompressed after every book write; the maximum levels are kept
+# for bodies compressed once at startup
+DYNAMIC_GZIP_LEVEL = 6
+DYNAMIC_BROTLI_QUALITY = 5
+
+
+class Asset:
+    # A response body with its gzip and brotli encodings and strong ETags computed once
+    def __init__(self, body: bytes, media_type: str, cache_control: str, gzip_level: int = 9, brotli_quality: int = 11):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = {"identity": (body, f'"{digest}"'),
+                          "gzip": (gzip.compress(body, compresslevel=gzip_level, mtime=0), f'"{digest}-gz"')}
+        if brotli is not None:
+            self.encodings["br"] = (brotli.compress(body, quality=brotli_quality), f'"{digest}-br"')
+
+    def _negotiate(self, accept_encoding: str):
+        accepted = set()
+        for part in accept_encoding.split(","):
+            coding, _, params = part.strip().partition(";")
+            if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(coding.strip().lower())
+        for coding in ("br", "gzip"):
+            if coding in self.encodings and (coding in accepted or "*" in accepted):
+                return coding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        coding = self._negotiate(request.headers.get("accept-encoding", ""))
+        body, etag = self.encodings[coding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+def _book_fragment(book: dict) -> str:
+    created_at = book["created_at"].strftime("%Y-%m-%d %H:%M") if book["created_at"] else ""
+    return (
+        '<div class="book"><div class="book-info">'
+        f'<h2>{html.escape(book["Title"])}</h2>'
+        f'<p>Author: {html.escape(book["Author"])}</p>'
+        f'<p>Published: {"Yes" if book["published"] else "No"}</p>'
+        f'<p>Created At: {created_at}</p>'
+        f'<p>Owner: {html.escape(book["Owners"]["name"])}</p>'
+        f'<p>Votes: {book["vote_count"]}</p>'
+        '</div></div>'
+    )
+
+
+class Renderer:
+    def __init__(self, books_ttl: float):
+        self.books_ttl = books_ttl
+        self.pages = {}
+        self.static = {}
+        self._books_template = None
+        self._books_page = None
+        self._books_expires = 0.0
+        self._books_lock = asyncio.Lock()
+
+    def prepare(self):
+        for name in ("login", "signup"):
+            body = (TEMPLATES_DIR / f"{name}.html").read_bytes()
+            self.pages[name] = Asset(body, "text/html; charset=utf-8", "no-cache")
+        self._books_template = (TEMPLATES_DIR / "books.html").read_text()
+        for path in STATIC_DIR.iterdir():
+            if path.suffix in STATIC_TYPES:
+                self.static[path.name] = Asset(path.read_bytes(), STATIC_TYPES[path.suffix], "public, max-age=3600")
+
+    def invalidate_books(self):
+        self._books_expires = 0.0
+
+    async def books_page(self, load_first_page) -> Asset:
+        # The first page of books is rendered into the HTML and shared by every visitor
+        # until it expires or a book write invalidates it.
+        if self._books_page is not None and time.monotonic() < self._books_expires:
+            return self._books_page
+        async with self._books_lock:
+            if self._books_page is None or time.monotonic() >= self._books_expires:
+                books, next_cursor = await load_first_page()
+                body = self._books_template.format(
+                    books="".join(_book_fragment(book) for book in books),
+                    next_cursor=html.escape(json.dumps(jsonable_encoder(next_cursor))),
+                    load_more_hidden="" if next_cursor else " hidden",
+                )
+                self._books_page = Asset(body.encode(), "text/html; charset=utf-8", "no-cache",
+                                         DYNAMIC_GZIP_LEVEL, DYNAMIC_BROTLI_QUALITY)
+                self._books_expires = time.monotonic() + self.books_ttl
+        return self._books_page
+
+
+renderer = Renderer(settings.books_page_ttl)
@@ -0,0 +1,191 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
+from .config import settings
+from .database import AsyncSessionLocal, async_url, pool_options, writer_key
+from .hub import json_batches
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_WRITERS = 100000
+WRITES_CHANNEL = "replica_writes"
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = async_url(url)
+        self.engine = create_async_engine(self.url, **pool_options(self.url))
+        self.sessionmaker = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+        self.in_flight = 0
+        self.healthy = True
+
+    @property
+    def name(self):
+        return self.url.render_as_string(hide_password=True)
+
+
+class ReplicaSet:
+    def __init__(self, urls: List[str], strategy: str = "round_robin", read_your_writes: float = 5.0):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica strategy {strategy!r}")
+        self.replicas = [Replica(url) for url in urls]
+        self.strategy = strategy
+        self.read_your_writes = read_your_writes
+        self._turn = itertools.count()
+        # writer key -> monotonic deadline, oldest deadline first
+        self._writers: OrderedDict = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._hub = None
+        self._outbox = []
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "least_connections":
+            return min(healthy, key=lambda replica: replica.in_flight)
+        return healthy[next(self._turn) % len(healthy)]
+
+    def mark_write(self, key: bytes):
+        # The next request may land on another worker, so writers are announced through
+        # the hub (batched per event loop turn) as well as remembered here
+        if not self.replicas:
+            return
+        self._remember(key)
+        if self._hub is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if not self._outbox:
+            loop.call_soon(self._announce)
+        self._outbox.append(key.hex())
+
+    def _announce(self):
+        outbox, self._outbox = self._outbox, []
+        for message in json_batches(outbox):
+            asyncio.create_task(self._publish(message))
+
+    async def _publish(self, message: str):
+        try:
+            await self._hub.broker.publish(WRITES_CHANNEL, message)
+        except Exception:
+            logger.exception("Failed to announce writers")
+
+    def receive(self, message: str):
+        for key in json.loads(message):
+            self._remember(bytes.fromhex(key))
+
+    def attach(self, hub):
+        self._hub = hub
+        hub.subscribe(WRITES_CHANNEL, self.receive)
+
+    def _remember(self, key: bytes):
+        self._writers[key] = time.monotonic() + self.read_your_writes
+        self._writers.move_to_end(key)
+        now = time.monotonic()
+        while self._writers:
+            oldest, deadline = next(iter(self._writers.items()))
+            if deadline > now and len(self._writers) <= MAX_TRACKED_WRITERS:
+                break
+            del self._writers[oldest]
+
+    def wrote_recently(self, key: Optional[bytes]) -> bool:
+        if key is None:
+            return False
+        deadline = self._writers.get(key)
+        return deadline is not None and deadline > time.monotonic()
+
+    def eject(self, replica: Replica, reason):
+        if replica.healthy:
+            logger.warning("Ejecting replica %s: %s", replica.name, reason)
+        replica.healthy = False
+
+    async def _probe(self, replica: Replica) -> float:
+        async with replica.engine.connect() as conn:
+            if conn.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            # The last replayed commit ages while the primary is idle, so a replica that has
+            # replayed everything it received is current. NULL on a primary.
+            return (await conn.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"))).scalar() or 0.0
+
+    async def check(self, replica: Replica):
+        try:
+            lag = await asyncio.wait_for(self._probe(replica), settings.replica_health_timeout)
+        except Exception as e:
+            self.eject(replica, str(e) or type(e).__name__)
+            return
+        if lag > settings.replica_max_lag:
+            self.eject(replica, f"replication lag {lag:.1f}s")
+        elif not replica.healthy:
+            logger.info("Replica %s is healthy again", replica.name)
+            replica.healthy = True
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_all()
+
+    async def start(self):
+        if self.replicas and self._task is None:
+            await self.check_all()
+            self._task = asyncio.create_task(self._run(settings.replica_health_interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    @asynccontextmanager
+    async def session(self, key: Optional[bytes] = None):
+        replica = None if self.wrote_recently(key) else self.choose()
+        if replica is None:
+            async with AsyncSessionLocal() as db:
+                yield db
+            return
+        replica.in_flight += 1
+        try:
+            async with replica.sessionmaker() as db:
+                yield db
+        except DBAPIError as e:
+            if e.connection_invalidated or isinstance(e, (OperationalError, InterfaceError)):
+                self.eject(replica, e)
+            raise
+        finally:
+            replica.in_flight -= 1
+
+
+replica_set = ReplicaSet(settings.database_replica_urls, settings.replica_strategy, settings.replica_read_your_writes)
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_write(session):
+    key = session.info.get("writer")
+    if key is not None:
+        replica_set.mark_write(key)
+
+
+async def get_read_db(connection: HTTPConnection):
+    # For read-only handlers: a replica session, or the primary if there is no healthy
+    # replica or this caller committed a write within the read-your-writes window
+    async with replica_set.session(writer_key(connection)) as db:
+        yield db
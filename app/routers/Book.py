@@ -1,98 +1,232 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from .. import models, schemas, utils, oauth2
-from ..database import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from .. import models, schemas, utils, oauth2, ingest, user_stats
+from ..cache import cache
+from ..search import search_index, postgres_search
+from ..rendering import renderer
+from ..ratelimit import rate_limit
+from ..trending import trending, WINDOWS
+from ..config import settings
+from ..serializers import RowLayout, FastJSONResponse, dumps, json_response
+from ..loaders import Loaders, batch_loader, get_loaders
+from ..database import get_async_db, writer_key
+from ..replicas import get_read_db, replica_set
 from datetime import datetime
-from typing import List
-from sqlalchemy import func
-from sqlalchemy.orm import joinedload
+from typing import List, Optional
+from sqlalchemy import select, insert, and_, or_
 
 app = APIRouter()
 
-@app.post("/")
-def get_books(db: Session = Depends(get_db), current_user: int = Depends(oauth2.get_current_user)):
-    books = db.query(models.Book).filter(models.Book.Owners_id == current_user.id).all()
-    results = db.query(models.Book, func.count(models.vote.book_id).label("vote_count")) \
-                .join(models.vote, models.Book.id == models.vote.book_id, isouter=True) \
-                .group_by(models.Book.id).all()
-    print(results)
-    # Serialize the results
-    serialized_results = []
-    for book, vote_count in results:
-        serialized_results.append({
-            "id": book.id,
-            "Title": book.Title,
-            "Author": book.Author,
-            "published": book.published,
-            "created_at": book.created_at,
-            "Owners_id": book.Owners_id,
-            "vote_count": vote_count
-        })
-
-    if not books:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No books found for the current user")
-
-    return serialized_results
-
-
-@app.get("/sqlalchemy", response_model=List[schemas.BookInDB], status_code=status.HTTP_200_OK)
-def sqlalchemy(db: Session = Depends(get_db),  current_user: int = Depends(oauth2.get_current_user)):
-    books = db.query(models.Book).filter(models.Book.Owners_id == current_user.id).all()
-    return books
+STREAM_BATCH_SIZE = 1000
+
+
+def _book_listing(owner_id: Optional[int], author: Optional[str], published: Optional[bool],
+                  after_id: Optional[int], after_created_at: Optional[datetime]):
+    stmt = select(models.Book.id, models.Book.Title, models.Book.Author, models.Book.published,
+                  models.Book.created_at, models.Book.Owners_id, models.Book.vote_count,
+                  models.users.name.label("owner_name")) \
+        .join(models.users, models.users.id == models.Book.Owners_id)
+    if owner_id is not None:
+        stmt = stmt.where(models.Book.Owners_id == owner_id)
+    if author is not None:
+        stmt = stmt.where(models.Book.Author == author)
+    if published is not None:
+        stmt = stmt.where(models.Book.published == published)
+    if after_id is not None:
+        # Keyset cursor on (created_at, id): id breaks ties between books created in the same instant
+        stmt = stmt.where(or_(models.Book.created_at > after_created_at,
+                              and_(models.Book.created_at == after_created_at, models.Book.id > after_id)))
+    return stmt.order_by(models.Book.created_at, models.Book.id)
+
+
+BOOK_LAYOUT = RowLayout(_book_listing(None, None, None, None, None).selected_columns.keys(),
+                        nested={"Owners": {"id": "Owners_id", "name": "owner_name"}}, hidden=["owner_name"])
+
+
+def _book_row(row):
+    return BOOK_LAYOUT.row(row)
+
+
+@batch_loader("books")
+async def _load_books(db: AsyncSession, ids):
+    rows = await db.execute(_book_listing(None, None, None, None, None).where(models.Book.id.in_(ids)))
+    return {row.id: _book_row(row) for row in rows}
+
+
+def _check_cursor(after_id: Optional[int], after_created_at: Optional[datetime]):
+    if (after_id is None) != (after_created_at is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="after_id and after_created_at must be given together")
+
+
+@app.post("/", response_class=FastJSONResponse)
+async def get_books(limit: int = Query(50, ge=1, le=500), after_id: Optional[int] = None, after_created_at: Optional[datetime] = None,
+                    owner_id: Optional[int] = None, author: Optional[str] = None, published: Optional[bool] = None,
+                    db: AsyncSession = Depends(get_read_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    _check_cursor(after_id, after_created_at)
+    result = await db.execute(_book_listing(owner_id, author, published, after_id, after_created_at).limit(limit))
+    books = BOOK_LAYOUT.rows(result)
+
+    next_cursor = None
+    if len(books) == limit:
+        next_cursor = {"after_id": books[-1]["id"], "after_created_at": books[-1]["created_at"]}
+    return json_response({"books": books, "next_cursor": next_cursor})
+
+
+@app.post("/stream")
+async def stream_books(request: Request, owner_id: Optional[int] = None, author: Optional[str] = None, published: Optional[bool] = None,
+                       after_id: Optional[int] = None, after_created_at: Optional[datetime] = None,
+                       current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    _check_cursor(after_id, after_created_at)
+    key = writer_key(request)
+    stmt = _book_listing(owner_id, author, published, after_id, after_created_at) \
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    async def rows():
+        # The request-scoped session from get_async_db is closed before the body is sent,
+        # so the generator owns its own session for the lifetime of the stream.
+        async with replica_set.session(key) as db:
+            result = await db.stream(stmt)
+            async for row in result:
+                yield dumps(BOOK_LAYOUT.row(row)) + b"\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@app.get("/sqlalchemy", response_model=List[schemas.BookInDB], response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
+async def sqlalchemy(db: AsyncSession = Depends(get_read_db),  current_user: int = Depends(oauth2.get_current_user)):
+    # One joined SELECT of just the columns BookInDB needs, encoded straight from the rows
+    result = await db.execute(_book_listing(current_user.id, None, None, None, None))
+    return json_response(BOOK_LAYOUT.rows(result))
 
 @app.post("/create_new_book", response_model=schemas.BookInDB, status_code=status.HTTP_201_CREATED)
-def create_new_book(book: schemas.BookCreate, db: Session = Depends(get_db)):
+async def create_new_book(book: schemas.BookCreate, db: AsyncSession = Depends(get_async_db), current_user: models.users = Depends(oauth2.get_current_user_row)):
     if not book.created_at: 
         book.created_at = datetime.utcnow() 
 
-    db_book = models.Book(**book.dict())
+    # The owner row is already in this session, so Owners needs no query
+    db_book = models.Book(**book.dict(), Owners=current_user)
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    try:
+        await user_stats.books_added(db, current_user.id, 1, int(book.published))
+        await db.commit()
+    except IntegrityError:
+        # The owner was deleted while another worker still had the row cached
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
+    await db.refresh(db_book, ["vote_count"])
+    search_index.add(db_book.id, db_book.Title, db_book.Author)
+    renderer.invalidate_books()
     return db_book
 
+@app.get("/books/search", response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
+async def search_books(q: str = Query(..., min_length=1, max_length=200), limit: int = Query(20, ge=1, le=100),
+                       offset: int = Query(0, ge=0, le=10000), db: AsyncSession = Depends(get_read_db)):
+    if search_index.enabled:
+        ranked = search_index.search(q, limit, offset)
+        rows = (await db.execute(_book_listing(None, None, None, None, None)
+                                 .where(models.Book.id.in_([book_id for book_id, _ in ranked])))).all()
+        by_id = {row.id: row for row in rows}
+        results = [{**_book_row(by_id[book_id]), "rank": score} for book_id, score in ranked if book_id in by_id]
+    else:
+        rows = await db.execute(postgres_search(_book_listing(None, None, None, None, None), q, limit, offset))
+        results = [{**_book_row(row), "rank": row.rank} for row in rows]
+    return json_response({"results": results, "limit": limit, "offset": offset})
+
+@app.get("/books/trending", response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
+async def trending_books(window: str = Query("24h", pattern="^(" + "|".join(WINDOWS) + ")$"),
+                         limit: int = Query(10, ge=1, le=settings.trending_capacity), loaders: Loaders = Depends(get_loaders)):
+    ranked = trending.top(window, limit)
+    found = await loaders["books"].load_many([book_id for book_id, _ in ranked])
+    books = [{**book, "recent_votes": votes} for book, (_, votes) in zip(found, ranked) if book is not None]
+    return json_response({"window": window, "books": books})
+
+@app.get("/books:batchGet", response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
+async def batch_get_books(ids: List[int] = Query(..., min_length=1), loaders: Loaders = Depends(get_loaders)):
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > settings.batch_get_max:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {settings.batch_get_max} ids per request")
+    found = await loaders["books"].load_many(ids)
+    return json_response({"books": [book for book in found if book is not None],
+                          "missing": [book_id for book_id, book in zip(ids, found) if book is None]})
+
+@app.post("/books/import", status_code=status.HTTP_202_ACCEPTED, dependencies=[rate_limit("import", by_user=True)])
+async def import_books(request: Request, background_tasks: BackgroundTasks, format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+                       current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    # Answers once the upload is received; follow progress at /books/import/{job_id}
+    if format is None:
+        format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    body = await ingest.spool(request.stream())
+    job = ingest.new_job(current_user.id)
+    background_tasks.add_task(ingest.run_import, job, body, format)
+    return job.summary()
+
+@app.get("/books/import/{job_id}", status_code=status.HTTP_200_OK)
+async def import_status(job_id: str, current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    job = ingest.jobs.get(job_id)
+    if job is None or job.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.summary()
+
 @app.get("/books/{id}", status_code=status.HTTP_200_OK)
-def get_book(id: int, db: Session = Depends(get_db)):
-    book = db.query(models.Book).filter(models.Book.id == id).first()
-    if book:
-        return book
-    raise HTTPException(status_code=404, detail="Book not found")
+async def get_book(id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Cache fills read the primary (see ResponseCache)
+    async def load():
+        return await db.get(models.Book, id)
+    return await cache.respond(request, f"book:{id}", load, "Book not found")
 
 @app.delete("/books/{id}", status_code=status.HTTP_200_OK)
-def delete_book(id: int, db: Session = Depends(get_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
-    book = db.query(models.Book).filter(models.Book.id == id, models.Book.Owners_id == current_user.id).first()
+async def delete_book(id: int, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    result = await db.execute(select(models.Book).where(models.Book.id == id, models.Book.Owners_id == current_user.id))
+    book = result.scalars().first()
     if book is None:
         raise HTTPException(status_code=404, detail="Book not found")
-    db.delete(book)
-    db.commit()
+    await user_stats.book_removed(db, current_user.id, id, book.published)
+    await db.delete(book)
+    await db.commit()
+    search_index.remove(id)
+    await trending.forget([id])
+    await cache.invalidate(f"book:{id}")
+    renderer.invalidate_books()
     return {"message": "Book deleted successfully", "id": id}
 
 @app.put("/books/{id}", status_code=status.HTTP_202_ACCEPTED)
-def update_book(id: int, book_data: schemas.BookCreate, db: Session = Depends(get_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
-    book = db.query(models.Book).filter(models.Book.id == id, models.Book.Owners_id == current_user.id).first()
+async def update_book(id: int, book_data: schemas.BookCreate, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    result = await db.execute(select(models.Book).where(models.Book.id == id, models.Book.Owners_id == current_user.id))
+    book = result.scalars().first()
     if book is None:
         raise HTTPException(status_code=404, detail="Book not found")
 
+    if book_data.published != book.published:
+        await user_stats.publication_changed(db, current_user.id, book_data.published)
     for key, value in book_data.dict().items():
         setattr(book, key, value)
-    db.commit()    
-    db.refresh(book)
+    await db.commit()    
+    await db.refresh(book)
+    search_index.add(book.id, book.Title, book.Author)
+    await cache.invalidate(f"book:{id}")
+    renderer.invalidate_books()
     return {"message": "Book updated successfully", "book": book}
 
 @app.post("/newpost", status_code=status.HTTP_201_CREATED)
-def add_books(new_books: List[schemas.BookCreate], db: Session = Depends(get_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
-    for book in new_books:
-        if book.created_at is None:
-            book.created_at = datetime.utcnow()
+async def add_books(new_books: List[schemas.BookCreate], db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    rows = [{**book.dict(), "created_at": book.created_at or datetime.utcnow(), "Owners_id": current_user.id}
+            for book in new_books]
+    if not rows:
+        return {"created": 0}
 
-        db_book = models.Book(**book.dict(), Owners_id=current_user.id)
-        db.add(db_book)
-    
     try:
-        db.commit()
+        created = (await db.execute(insert(models.Book).returning(models.Book.id, models.Book.Title, models.Book.Author), rows)).all()
+        await user_stats.books_added(db, current_user.id, len(rows), sum(row["published"] for row in rows))
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create books: {str(e)}")
     
-    return {"books": new_books}
-
+    for book in created:
+        search_index.add(book.id, book.Title, book.Author)
+    renderer.invalidate_books()
+    return {"created": len(rows)}
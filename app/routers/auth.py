@@ -1,20 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
 from .. import schemas, models, utils, database, oauth2
+from ..passwords import password_service, PasswordServiceBusy
+from ..ratelimit import rate_limit
 
 app = APIRouter(tags=["Authentication"])
 
-@app.post("/login_new", status_code=status.HTTP_200_OK, response_model=schemas.Token)
-def login_user(user: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    db_user = db.query(models.users).filter(models.users.email == user.username).first()
+@app.post("/login_new", status_code=status.HTTP_200_OK, response_model=schemas.Token, dependencies=[rate_limit("login")])
+async def login_user(user: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)):
+    db_user = (await db.execute(select(models.users).where(models.users.email == user.username))).scalars().first()
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invalid Email")
-    
-    if not utils.verify_password(user.password, db_user.password):
+
+    try:
+        valid, new_hash = await password_service.verify(user.password, db_user.password)
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many logins in progress, retry shortly",
+                            headers={"Retry-After": "1"})
+    if not valid:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invalid Password")
-    
+    if new_hash:
+        await db.execute(update(models.users).where(models.users.id == db_user.id).values(password=new_hash))
+        await db.commit()
+
     access_token = oauth2.create_access_token(data={"user_id": db_user.id, "email": db_user.email, "name": db_user.name})
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: str = Depends(oauth2.oauth2_scheme), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    await oauth2.revoke_access_token(token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 # Other code remains the same...
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from typing import Optional
+from ..config import settings
+from ..hub import encoded_size, hub
+
+app = APIRouter()
+
+
+@app.websocket("/ws")
+@app.websocket("/ws/books/{book_id}")
+async def chat(websocket: WebSocket, book_id: Optional[int] = None):
+    room = f"book:{book_id}" if book_id is not None else "lobby"
+    connection = await hub.connect(websocket, room)
+    try:
+        while True:
+            message = await websocket.receive_text()
+            # Every message has to fit in one broker payload
+            if encoded_size(message) > settings.chat_max_message_bytes:
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG, reason="Message too long")
+                break
+            hub.publish(room, message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(connection, room)
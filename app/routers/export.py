@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
+from .. import exports, oauth2, schemas
+from ..config import settings
+from ..ratelimit import rate_limit
+
+app = APIRouter(tags=["Export"])
+
+
+@app.get("/export/{table}", dependencies=[rate_limit("export", by_user=True)])
+async def export_table(table: str = Path(..., pattern="^(books|users|votes)$"),
+                       format: str = Query("csv", pattern=r"^(csv|csv\.gz|arrow|parquet)$"),
+                       current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    try:
+        encoder = exports.build_encoder(format, exports.EXPORTS[table])
+    except exports.ExportUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    return StreamingResponse(exports.stream_export(table, encoder, settings.export_batch_size),
+                             media_type=encoder.media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{table}.{encoder.extension}"'})
@@ -1,32 +1,111 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from .. import models, schemas, utils, oauth2
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from .. import models, schemas, utils, oauth2, user_stats
+from ..config import settings
+from ..database import get_async_db, dialect_insert
+from ..votes import vote_counter
+from ..events import vote_feed
+from ..ratelimit import rate_limit
+from ..trending import trending
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 app = APIRouter()
 
-@app.post("/vote", status_code=status.HTTP_200_OK)
-def vote(vote: schemas.Vote, db: Session = Depends(get_db), current_user: int = Depends(oauth2.get_current_user)):
+
+# Both return the vote's created_at, or None if there was nothing to add or remove;
+# the trending leaderboard files a removal under the bucket the vote was counted in.
+async def _add_vote(db: AsyncSession, book_id: int, user_id: int) -> Optional[datetime]:
+    stmt = dialect_insert(db, models.vote).values(book_id=book_id, user_id=user_id) \
+        .on_conflict_do_nothing().returning(models.vote.created_at)
+    return (await db.execute(stmt)).scalar()
+
+
+async def _remove_vote(db: AsyncSession, book_id: int, user_id: int) -> Optional[datetime]:
+    stmt = delete(models.vote).where(models.vote.book_id == book_id, models.vote.user_id == user_id) \
+        .returning(models.vote.created_at)
+    return (await db.execute(stmt)).scalar()
+
+
+@app.post("/vote", status_code=status.HTTP_200_OK, dependencies=[rate_limit("vote", by_user=True)])
+async def vote(vote: schemas.Vote, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
     if vote.dir not in [0, 1]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid vote direction")
-    
-    vote_query = db.query(models.vote).filter(models.vote.book_id == vote.book_id, models.vote.user_id == current_user.id)
-    found_vote = vote_query.first()
 
     if (vote.dir == 1):
-        if found_vote:
+        try:
+            added = await _add_vote(db, vote.book_id, current_user.id)
+            if added is not None:
+                await user_stats.votes_changed(db, {vote.book_id: 1})
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+        if added is None:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="You have already voted for this book")
-        new_vote = models.vote(book_id=vote.book_id, user_id=current_user.id)
-        db.add(new_vote)
-        db.commit()
-        db.refresh(new_vote)
+        vote_counter.add(vote.book_id, 1)
+        await trending.record([(vote.book_id, 1, added)])
         return {'message': 'Vote recorded successfully'}
     else:
-        if not found_vote:
+        removed = await _remove_vote(db, vote.book_id, current_user.id)
+        if removed is not None:
+            await user_stats.votes_changed(db, {vote.book_id: -1})
+        await db.commit()
+        if removed is None:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You have not voted for this book")
-        vote_query.delete()
-        db.commit()
+        vote_counter.add(vote.book_id, -1)
+        await trending.record([(vote.book_id, -1, removed)])
 
     return {"message": "Deleted vote successfully"}
+
+
+@app.post("/vote/batch", status_code=status.HTTP_200_OK, dependencies=[rate_limit("vote_batch", by_user=True)])
+async def vote_batch(votes: List[schemas.Vote], db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    if len(votes) > settings.vote_batch_max:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {settings.vote_batch_max} votes per batch")
+    if any(v.dir not in [0, 1] for v in votes):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid vote direction")
+
+    book_ids = {v.book_id for v in votes}
+    existing = set((await db.execute(select(models.Book.id).where(models.Book.id.in_(book_ids)))).scalars())
+
+    # Operations are applied in order, so a queued vote followed by an unvote cancels out
+    results = []
+    deltas = {}
+    events = []
+    try:
+        for v in votes:
+            created_at = None
+            if v.book_id not in existing:
+                code = status.HTTP_404_NOT_FOUND
+            elif v.dir == 1:
+                created_at = await _add_vote(db, v.book_id, current_user.id)
+                code = status.HTTP_200_OK if created_at is not None else status.HTTP_409_CONFLICT
+            else:
+                created_at = await _remove_vote(db, v.book_id, current_user.id)
+                code = status.HTTP_200_OK if created_at is not None else status.HTTP_400_BAD_REQUEST
+            if code == status.HTTP_200_OK:
+                deltas[v.book_id] = deltas.get(v.book_id, 0) + (1 if v.dir == 1 else -1)
+                events.append((v.book_id, 1 if v.dir == 1 else -1, created_at))
+            results.append({"book_id": v.book_id, "dir": v.dir, "status": code})
+        await user_stats.votes_changed(db, deltas)
+        await db.commit()
+    except IntegrityError:
+        # A book was deleted between the existence check and the insert
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Books changed during the batch, retry")
+
+    for book_id, delta in deltas.items():
+        vote_counter.add(book_id, delta)
+    await trending.record(events)
+    return {"results": results}
+
+
+@app.get("/votes/stream")
+async def vote_stream(last_event_id: Optional[int] = Header(None, alias="Last-Event-ID")):
+    return StreamingResponse(vote_feed.stream(last_event_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
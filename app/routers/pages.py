@@ -0,0 +1,94 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from .. import models, schemas, oauth2
+from ..cache import cache
+from ..config import settings
+from ..database import get_async_db
+from ..replicas import get_read_db, replica_set
+from ..passwords import password_service, PasswordServiceBusy
+from ..ratelimit import rate_limit
+from ..rendering import renderer
+from . import Book
+
+app = APIRouter(include_in_schema=False)
+
+
+@app.get("/login", response_class=HTMLResponse)
+async def login(request: Request):
+    return renderer.pages["login"].response(request)
+
+
+@app.post("/login", dependencies=[rate_limit("login")])
+async def login_form(username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(models.users).where(models.users.email == username))).scalars().first()
+    try:
+        valid = db_user is not None and (await password_service.verify(password, db_user.password))[0]
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many logins in progress, retry shortly",
+                            headers={"Retry-After": "1"})
+    if not valid:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    access_token = oauth2.create_access_token(data={"user_id": db_user.id, "email": db_user.email, "name": db_user.name})
+    response = RedirectResponse(url="/books", status_code=status.HTTP_303_SEE_OTHER)
+    response.set_cookie(key="access_token", value=access_token, httponly=True)
+    return response
+
+
+@app.get("/signup", response_class=HTMLResponse)
+async def signup(request: Request):
+    return renderer.pages["signup"].response(request)
+
+
+@app.post("/signup", dependencies=[rate_limit("register")])
+async def signup_form(username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+    try:
+        user = schemas.UserCreate(name=username.split("@")[0], email=username, password=password)
+    except ValidationError:
+        raise HTTPException(status_code=400, detail="Username must be an email address")
+    if (await db.execute(select(models.users.id).where(models.users.email == user.email))).first():
+        raise HTTPException(status_code=400, detail="Username already taken")
+    try:
+        user.password = await password_service.hash(user.password)
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many signups in progress, retry shortly",
+                            headers={"Retry-After": "1"})
+    db.add(models.users(**user.dict()))
+    await db.commit()
+    await cache.invalidate_prefix("users:list:")
+    return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+
+
+async def load_first_page():
+    async with replica_set.session() as db:
+        stmt = Book._book_listing(None, None, None, None, None).limit(settings.books_page_size)
+        books = [Book._book_row(row) for row in await db.execute(stmt)]
+    next_cursor = None
+    if len(books) == settings.books_page_size:
+        next_cursor = {"after_id": books[-1]["id"], "after_created_at": books[-1]["created_at"]}
+    return books, next_cursor
+
+
+@app.get("/books", response_class=HTMLResponse)
+async def books(request: Request):
+    page = await renderer.books_page(load_first_page)
+    return page.response(request)
+
+
+@app.get("/books/page")
+async def books_next_page(after_id: int, after_created_at: datetime, db: AsyncSession = Depends(get_read_db),
+                          current_user: schemas.TokenData = Depends(oauth2.get_cookie_user)):
+    # "Load more" on /books, authenticated by the login cookie
+    return await Book.get_books(limit=settings.books_page_size, after_id=after_id, after_created_at=after_created_at,
+                                owner_id=None, author=None, published=None, db=db, current_user=current_user)
+
+
+@app.get("/static/{name}")
+async def static_asset(name: str, request: Request):
+    asset = renderer.static.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return asset.response(request)
@@ -1,41 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from .. import schemas, models, utils
-from ..database import get_db
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from .. import schemas, models, utils, user_stats, oauth2
+from ..database import get_async_db
+from ..passwords import password_service, PasswordServiceBusy
+from ..ratelimit import rate_limit
+from ..cache import cache
+from ..search import search_index
+from ..trending import trending
+from ..votes import vote_counter
+from ..serializers import RowLayout, FastJSONResponse, json_response
+from ..loaders import Loaders, batch_loader, get_loaders
+from ..config import settings
+from typing import List, Optional
 
 app = APIRouter()
 
-@app.post("/register", status_code=status.HTTP_201_CREATED, response_model=schemas.UserCreate)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+# The UserBase fields, encoded straight from the rows
+USER_COLUMNS = (models.users.id, models.users.name, models.users.email, models.users.created_at)
+USER_LAYOUT = RowLayout([column.key for column in USER_COLUMNS])
+
+
+@batch_loader("users")
+async def _load_users(db: AsyncSession, ids):
+    rows = await db.execute(select(*USER_COLUMNS).where(models.users.id.in_(ids)))
+    return {row.id: USER_LAYOUT.row(row) for row in rows}
+
+
+@app.post("/register", status_code=status.HTTP_201_CREATED, response_model=schemas.UserCreate, dependencies=[rate_limit("register")])
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        user.password = await password_service.hash(user.password)
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many registrations in progress, retry shortly",
+                            headers={"Retry-After": "1"})
     try:
-        user.password = utils.hash_password(user.password)
         db_user = models.users(**user.dict())
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        await cache.invalidate_prefix("users:list:")
         return db_user
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 @app.get("/users", status_code=status.HTTP_200_OK, response_model=List[schemas.UserBase])
-def get_users(db: Session = Depends(get_db)):
-    users = db.query(models.users).all()
-    return users
+async def get_users(request: Request, skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+                    db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        rows = await db.execute(select(*USER_COLUMNS).order_by(models.users.id).offset(skip).limit(limit))
+        return USER_LAYOUT.rows(rows)
+    return await cache.respond(request, f"users:list:{skip}:{limit}", load, "Users not found")
+
+@app.get("/users:batchGet", response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
+async def batch_get_users(ids: List[int] = Query(..., min_length=1), loaders: Loaders = Depends(get_loaders)):
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > settings.batch_get_max:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {settings.batch_get_max} ids per request")
+    found = await loaders["users"].load_many(ids)
+    return json_response({"users": [user for user in found if user is not None],
+                          "missing": [user_id for user_id, user in zip(ids, found) if user is None]})
+
+@app.get("/users/me", status_code=status.HTTP_200_OK, response_model=schemas.UserBase)
+async def get_me(current_user: models.users = Depends(oauth2.get_current_user_row)):
+    return current_user
 
 @app.get("/users/{id}", status_code=status.HTTP_200_OK, response_model=schemas.UserBase)
-def get_user(id: int, db: Session = Depends(get_db)):
-    user = db.query(models.users).filter(models.users.id == id).first()
-    if user:
-        return user
-    raise HTTPException(status_code=404, detail="User not found")
+async def get_user(id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        row = (await db.execute(select(*USER_COLUMNS).where(models.users.id == id))).first()
+        return USER_LAYOUT.row(row) if row else None
+    return await cache.respond(request, f"user:{id}", load, "User not found")
+
+@app.get("/users/{id}/stats", status_code=status.HTTP_200_OK)
+async def get_user_stats(id: int, db: AsyncSession = Depends(get_async_db)):
+    stats = await user_stats.stats_for(db, id)
+    if stats is not None:
+        return stats
+    if await db.get(models.users, id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"user_id": id, "books": 0, "published": 0, "unpublished": 0, "votes_received": 0, "most_voted": None}
 
 @app.delete("/users/{id}", status_code=status.HTTP_200_OK)
-def delete_user(id: int, db: Session = Depends(get_db)):
-    user = db.query(models.users).filter(models.users.id == id).first()
+async def delete_user(id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(models.users, id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    # Owned books go with the user (ON DELETE CASCADE), so their cached copies must go too
+    book_ids = (await db.execute(select(models.Book.id).where(models.Book.Owners_id == id))).scalars().all()
+    user_votes = (await db.execute(select(models.vote.book_id, models.vote.created_at)
+                                   .where(models.vote.user_id == id))).all()
+    # Votes cast on other users' books go with the user too
+    received = {}
+    for book_id, _ in user_votes:
+        received[book_id] = received.get(book_id, 0) - 1
+    await user_stats.votes_changed(db, received)
+    await db.delete(user)
+    await db.commit()
+    await oauth2.user_cache.user_deleted(id)
+    for book_id, delta in received.items():
+        vote_counter.add(book_id, delta)
+    await trending.record([(book_id, -1, created_at) for book_id, created_at in user_votes])
+    await cache.invalidate(f"user:{id}", *[f"book:{book_id}" for book_id in book_ids])
+    for book_id in book_ids:
+        search_index.remove(book_id)
+    await trending.forget(book_ids)
+    await cache.invalidate_prefix("users:list:")
     return {"message": "User deleted successfully", "id": id}
@@ -25,6 +25,14 @@ class userlogin(BaseModel):
     password: str
    
 
+class OwnerSummary(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        orm_mode = True
+
+
 # Book Schema
 class BookBase(BaseModel):
     Title: str
@@ -41,8 +49,8 @@ class BookInDB(BookBase):
     id: int
     created_at: datetime
     Owners_id: int
-    Owners: userlogin
-    votes: Optional[int] = 0  # Add this field to store the vote count
+    Owners: OwnerSummary
+    vote_count: int = 0
 
     class Config:
         orm_mode = True
@@ -0,0 +1,173 @@
+import asyncio
+import bisect
+import json
+import logging
+import re
+import threading
+from collections import defaultdict
+from sqlalchemy import func, literal_column, or_, select
+from . import models
+from .hub import json_batches
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+REBUILD_BATCH_SIZE = 10000
+SEARCH_CHANNEL = "search"
+
+
+def tokenize(text: str):
+    return TOKEN_RE.findall(text.lower())
+
+
+def search_document():
+    # Must stay textually identical to the ix_books_search expression index in models.py
+    return func.to_tsvector(literal_column("'simple'"),
+                            models.Book.Title + literal_column("' '") + models.Book.Author)
+
+
+def postgres_search(stmt, q: str, limit: int, offset: int):
+    # Ranks and pages `stmt`, a select over books, adding a trailing "rank" column
+    terms = tokenize(q)
+    tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms))
+    document = search_document()
+    rank = func.ts_rank(document, tsquery) + \
+        func.greatest(func.similarity(models.Book.Title, q), func.similarity(models.Book.Author, q))
+    return stmt.add_columns(rank.label("rank")) \
+        .where(or_(document.op("@@")(tsquery), models.Book.Title.op("%")(q), models.Book.Author.op("%")(q))) \
+        .order_by(None).order_by(rank.desc(), models.Book.id).offset(offset).limit(limit)
+
+
+class InvertedIndex:
+    # In-process prefix index used when the database has no tsvector/pg_trgm support
+    # (SQLite stand-ins). Each worker keeps its own copy; writes are applied here and
+    # announced through the hub (batched per event loop turn) to the other workers.
+    def __init__(self):
+        self.enabled = False
+        self._postings = defaultdict(set)
+        self._documents = {}
+        self._tokens = []
+        self._lock = threading.Lock()
+        self._hub = None
+        self._outbox = []
+
+    def add(self, book_id: int, title: str, author: str):
+        if not self.enabled:
+            return
+        self._add(book_id, title, author)
+        self._announce([book_id, title, author])
+
+    def remove(self, book_id: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(book_id)
+        self._announce([book_id, None, None])
+
+    def _announce(self, item):
+        if self._hub is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if not self._outbox:
+            loop.call_soon(self._flush)
+        self._outbox.append(item)
+
+    def _flush(self):
+        outbox, self._outbox = self._outbox, []
+        for message in json_batches(outbox):
+            asyncio.create_task(self._publish(message))
+
+    async def _publish(self, message: str):
+        try:
+            await self._hub.broker.publish(SEARCH_CHANNEL, message)
+        except Exception:
+            logger.exception("Failed to publish search index updates")
+
+    def receive(self, message: str):
+        # Another worker's writes, or this worker's own coming back from the broker
+        if not self.enabled:
+            return
+        for book_id, title, author in json.loads(message):
+            if title is None:
+                with self._lock:
+                    self._remove(book_id)
+            else:
+                self._add(book_id, title, author)
+
+    def start(self, hub):
+        self._hub = hub
+        hub.subscribe(SEARCH_CHANNEL, self.receive)
+
+    def _add(self, book_id: int, title: str, author: str):
+        with self._lock:
+            self._remove(book_id)
+            tokens = set(tokenize(title) + tokenize(author))
+            self._documents[book_id] = tokens
+            for token in tokens:
+                if token not in self._postings:
+                    bisect.insort(self._tokens, token)
+                self._postings[token].add(book_id)
+
+    def _remove(self, book_id: int):
+        for token in self._documents.pop(book_id, ()):
+            postings = self._postings[token]
+            postings.discard(book_id)
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def _matches(self, term: str):
+        # Exact token hits score 2, other tokens starting with the term score 1
+        scores = {}
+        start = bisect.bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            weight = 2 if token == term else 1
+            for book_id in self._postings[token]:
+                if scores.get(book_id, 0) < weight:
+                    scores[book_id] = weight
+        return scores
+
+    def search(self, q: str, limit: int, offset: int):
+        terms = tokenize(q)
+        if not terms:
+            return []
+        with self._lock:
+            scores = None
+            for term in terms:
+                matches = self._matches(term)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {book_id: score + matches[book_id] for book_id, score in scores.items() if book_id in matches}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[offset:offset + limit]
+
+    def rebuild(self, bind):
+        self.enabled = bind.dialect.name != "postgresql"
+        if not self.enabled:
+            return
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._tokens.clear()
+        last_id = 0
+        with bind.connect() as conn:
+            while True:
+                rows = conn.execute(select(models.Book.id, models.Book.Title, models.Book.Author)
+                                    .where(models.Book.id > last_id).order_by(models.Book.id)
+                                    .limit(REBUILD_BATCH_SIZE)).all()
+                if not rows:
+                    break
+                for row in rows:
+                    self._add(row.id, row.Title, row.Author)
+                last_id = rows[-1].id
+
+
+search_index = InvertedIndex()
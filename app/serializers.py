@@ -0,0 +1,55 @@
+from operator import itemgetter
+from typing import Dict, Iterable, Optional, Sequence
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def dumps(data) -> bytes:
+    # orjson covers dicts, lists, datetimes and the other column types natively; anything
+    # it does not know goes through jsonable_encoder
+    return orjson.dumps(data, default=jsonable_encoder)
+
+
+def _getter(indexes):
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indexes)
+
+
+class RowLayout:
+    # Column positions are resolved once per statement, so a result row becomes a plain
+    # dict with two itemgetter calls and no model instance or per-field validation.
+    #   nested: output key -> {field: column}, e.g. {"Owners": {"id": "Owners_id", "name": "owner_name"}}
+    #   hidden: columns that only feed a nested object
+    def __init__(self, columns: Sequence[str], nested: Optional[Dict[str, Dict[str, str]]] = None,
+                 hidden: Iterable[str] = ()):
+        position = {column: index for index, column in enumerate(columns)}
+        hidden = set(hidden)
+        self.keys = tuple(column for column in columns if column not in hidden)
+        self._flat = _getter([position[key] for key in self.keys])
+        self._nested = [(key, tuple(fields), _getter([position[column] for column in fields.values()]))
+                        for key, fields in (nested or {}).items()]
+
+    def row(self, row) -> dict:
+        data = dict(zip(self.keys, self._flat(row)))
+        for key, fields, getter in self._nested:
+            data[key] = dict(zip(fields, getter(row)))
+        return data
+
+    def rows(self, rows) -> list:
+        return [self.row(row) for row in rows]
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_response(content, status_code: int = 200) -> FastJSONResponse:
+    # Returning the response directly skips FastAPI's jsonable_encoder pass over the whole
+    # payload; routes opt in with `response_class=FastJSONResponse` and this helper.
+    return FastJSONResponse(content, status_code=status_code)
@@ -0,0 +1,127 @@
+# Multi-worker launcher:
+#   python -m app.serve
+# The listening socket is bound once here and shared by every worker. SIGTERM/SIGINT
+# drain all workers; SIGHUP restarts them one at a time, starting each replacement and
+# waiting until it has warmed up before draining the worker it replaces.
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import uvicorn
+from .config import settings
+
+logger = logging.getLogger("app.serve")
+
+# How long a draining worker keeps reading after it stops accepting
+ACCEPT_GRACE_SECONDS = 0.5
+
+
+class WorkerServer(uvicorn.Server):
+    def __init__(self, config, ready):
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets=None):
+        # Lifespan startup (including warm-up) has finished once this returns
+        await super().startup(sockets=sockets)
+        self.ready.set()
+
+    async def shutdown(self, sockets=None):
+        # Uvicorn closes every connection that has no request in flight. One accepted
+        # just before the drain may still have its request on the wire, and closing it
+        # resets the client, so stop accepting first and let those requests arrive.
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(ACCEPT_GRACE_SECONDS)
+        await super().shutdown(sockets=sockets)
+
+
+def run_worker(sock: socket.socket, ready):
+    config = uvicorn.Config("app.main:create_app", factory=True, lifespan="on",
+                            timeout_graceful_shutdown=int(settings.graceful_timeout))
+    WorkerServer(config, ready).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, host: str, port: int, workers: int):
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(2048)
+        self.socket.set_inheritable(True)
+        self.processes = []
+        self.stopping = False
+        self.restart_requested = False
+
+    def spawn(self, wait_ready: bool):
+        ready = self.context.Event()
+        process = self.context.Process(target=run_worker, args=(self.socket, ready), name="bookfastapi-worker")
+        process.start()
+        # Keep the event alive: if it is collected before the child unpickles it, the
+        # semaphore is gone and the worker dies on startup
+        process.ready = ready
+        if wait_ready and not ready.wait(settings.worker_ready_timeout):
+            logger.error("Worker %s did not become ready in %ss", process.pid, settings.worker_ready_timeout)
+        return process
+
+    def drain(self, processes):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        # Uvicorn waits up to graceful_timeout for in-flight requests, then runs the
+        # lifespan shutdown hooks (vote counter flush, pending imports).
+        deadline = time.monotonic() + settings.graceful_timeout + 10
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Killing worker %s after drain deadline", process.pid)
+                process.kill()
+                process.join()
+
+    def rolling_restart(self):
+        for index, old in enumerate(list(self.processes)):
+            self.processes[index] = self.spawn(wait_ready=True)
+            self.drain([old])
+        logger.info("Rolling restart complete")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self._restart)
+        self.processes = [self.spawn(wait_ready=False) for _ in range(self.workers)]
+        logger.info("Started %d workers on %s", self.workers, self.socket.getsockname())
+        while not self.stopping:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            for index, process in enumerate(self.processes):
+                if not process.is_alive() and not self.stopping:
+                    logger.warning("Worker %s exited with %s, replacing it", process.pid, process.exitcode)
+                    self.processes[index] = self.spawn(wait_ready=False)
+            time.sleep(0.5)
+        self.drain(self.processes)
+        self.socket.close()
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _restart(self, signum, frame):
+        self.restart_requested = True
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    workers = settings.workers or os.cpu_count() or 1
+    if workers > 1 and settings.hub_backend == "memory":
+        logger.warning("HUB_BACKEND=memory with %d workers: cache invalidations, chat rooms and vote "
+                       "feeds do not reach the other workers; use redis or postgres", workers)
+    Supervisor(settings.host, settings.port, workers).run()
+
+
+if __name__ == "__main__":
+    main()
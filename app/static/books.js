@@ -0,0 +1,56 @@
+// The first page of books is rendered by the server; further pages use the keyset cursor
+// and the login cookie.
+
+function renderBook(book) {
+    const bookElement = document.createElement('div');
+    bookElement.classList.add('book');
+    const info = document.createElement('div');
+    info.classList.add('book-info');
+    const fields = [
+        ['h2', book.Title],
+        ['p', `Author: ${book.Author}`],
+        ['p', `Published: ${book.published ? 'Yes' : 'No'}`],
+        ['p', `Created At: ${new Date(book.created_at).toLocaleString()}`],
+        ['p', `Owner: ${book.Owners.name}`],
+        ['p', `Votes: ${book.vote_count}`],
+    ];
+    fields.forEach(([tag, text]) => {
+        const element = document.createElement(tag);
+        element.textContent = text;
+        info.appendChild(element);
+    });
+    bookElement.appendChild(info);
+    return bookElement;
+}
+
+async function loadMoreBooks() {
+    const booksContainer = document.getElementById('books-container');
+    const cursor = JSON.parse(booksContainer.dataset.nextCursor || 'null');
+    if (!cursor) {
+        return;
+    }
+    const params = new URLSearchParams({after_id: cursor.after_id, after_created_at: cursor.after_created_at});
+    const response = await fetch(`/books/page?${params}`, {credentials: 'same-origin'});
+    if (!response.ok) {
+        return;
+    }
+    const page = await response.json();
+    page.books.forEach(book => booksContainer.appendChild(renderBook(book)));
+    booksContainer.dataset.nextCursor = JSON.stringify(page.next_cursor);
+    document.getElementById('load-more').hidden = !page.next_cursor;
+}
+
+const socket = new WebSocket(`${location.protocol === 'https:' ? 'wss' : 'ws'}://${location.host}/ws`);
+
+socket.onmessage = function(event) {
+    const messages = document.getElementById('messages');
+    const message = document.createElement('div');
+    message.textContent = event.data;
+    messages.appendChild(message);
+};
+
+function sendMessage() {
+    const input = document.getElementById('message-input');
+    socket.send(input.value);
+    input.value = '';
+}
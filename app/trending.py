@@ -0,0 +1,272 @@
+import asyncio
+import bisect
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, insert, select, text
+from . import models
+from .config import settings
+from .database import engine
+from .hub import json_batches
+
+logger = logging.getLogger(__name__)
+
+TRENDING_CHANNEL = "trending"
+WINDOWS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+REBUILD_BATCH_SIZE = 10000
+# pg_advisory_xact_lock key serializing checkpoints across workers
+CHECKPOINT_LOCK_KEY = 0x7472656e64
+
+summary = models.TrendingBucket.__table__
+votes = models.vote.__table__
+books = models.Book.__table__
+
+
+def epoch(at: datetime) -> float:
+    # SQLite hands timestamps back naive; they are UTC
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return at.timestamp()
+
+
+class Leaderboard:
+    # Vote totals for one window and its top `capacity` books, kept sorted as
+    # (-votes, book_id). An increment repositions the book in place. A decrement of a
+    # listed book could let an unlisted one overtake it, so it only marks the list
+    # stale; the next read re-selects it from the totals with a bounded heap.
+    def __init__(self, span: int, capacity: int):
+        self.span = span
+        self.capacity = capacity
+        self.counts: Dict[int, int] = {}
+        self._top: List[Tuple[int, int]] = []
+        self._members = set()
+        self._stale = False
+
+    def bump(self, book_id: int, delta: int):
+        old = self.counts.get(book_id, 0)
+        new = old + delta
+        if new > 0:
+            self.counts[book_id] = new
+        else:
+            self.counts.pop(book_id, None)
+        if self._stale:
+            return
+        if book_id in self._members:
+            if delta < 0:
+                self._stale = True
+                return
+            self._top.remove((-old, book_id))
+            bisect.insort(self._top, (-new, book_id))
+        elif delta > 0 and (len(self._top) < self.capacity or (-new, book_id) < self._top[-1]):
+            bisect.insort(self._top, (-new, book_id))
+            self._members.add(book_id)
+            if len(self._top) > self.capacity:
+                self._members.discard(self._top.pop()[1])
+
+    def reset(self, counts: Dict[int, int]):
+        self.counts = counts
+        self._stale = True
+
+    def forget(self, book_id: int):
+        self.counts.pop(book_id, None)
+        if book_id in self._members:
+            self._stale = True
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        if self._stale:
+            best = heapq.nlargest(self.capacity, self.counts.items(), key=lambda item: (item[1], -item[0]))
+            self._top = [(-count, book_id) for book_id, count in best]
+            self._members = {book_id for book_id, _ in best}
+            self._stale = False
+        return [(book_id, -negated) for negated, book_id in self._top[:n]]
+
+
+class Trending:
+    # Votes are counted per (time bucket, book). Every window's leaderboard holds the
+    # sum over its trailing buckets; when the clock moves into a new bucket the buckets
+    # leaving a window are subtracted from it. Vote events travel through the hub
+    # broker so every worker keeps the same counts. Buckets are checkpointed to
+    # trending_buckets so a restart only rescans votes cast since the last checkpoint.
+    def __init__(self, bind, bucket_seconds: int, capacity: int):
+        self.bind = bind
+        self.bucket_seconds = bucket_seconds
+        self.boards = {name: Leaderboard(max(1, seconds // bucket_seconds), capacity)
+                       for name, seconds in WINDOWS.items()}
+        self.retention = max(board.span for board in self.boards.values())
+        self.buckets = defaultdict(lambda: defaultdict(int))
+        self._dirty = set()
+        self._now: Optional[int] = None
+        self._lock = threading.Lock()
+        self._hub = None
+        self._task = None
+
+    def _bucket(self, ts: float) -> int:
+        return int(ts // self.bucket_seconds)
+
+    def _advance(self, now: int):
+        if self._now is None:
+            self._now = now
+            return
+        if now <= self._now:
+            return
+        for board in self.boards.values():
+            # Buckets in (previous now - span, now - span] fall out of this window
+            first, last = self._now - board.span + 1, now - board.span
+            leaving = range(first, last + 1) if last - first < len(self.buckets) \
+                else [bucket for bucket in self.buckets if first <= bucket <= last]
+            for bucket in leaving:
+                for book_id, count in self.buckets.get(bucket, {}).items():
+                    board.bump(book_id, -count)
+        for bucket in [bucket for bucket in self.buckets if bucket <= now - self.retention]:
+            del self.buckets[bucket]
+        self._now = now
+
+    def apply(self, book_id: int, delta: int, ts: float):
+        with self._lock:
+            now = self._bucket(time.time())
+            self._advance(now)
+            bucket = min(self._bucket(ts), now)
+            if bucket <= now - self.retention:
+                return
+            counts = self.buckets[bucket]
+            counts[book_id] += delta
+            if counts[book_id] <= 0:
+                del counts[book_id]
+            self._dirty.add(bucket)
+            for board in self.boards.values():
+                if bucket > now - board.span:
+                    board.bump(book_id, delta)
+
+    def top(self, window: str, n: int) -> List[Tuple[int, int]]:
+        with self._lock:
+            self._advance(self._bucket(time.time()))
+            return self.boards[window].top(n)
+
+    def _forget(self, book_id: int):
+        with self._lock:
+            for counts in self.buckets.values():
+                counts.pop(book_id, None)
+            for board in self.boards.values():
+                board.forget(book_id)
+
+    async def record(self, events: Iterable[Tuple[int, int, datetime]]):
+        # (book_id, +1/-1, vote.created_at) after the vote transaction committed
+        await self._send([[book_id, delta, epoch(created_at)] for book_id, delta, created_at in events])
+
+    async def forget(self, book_ids: Iterable[int]):
+        # Deleted books leave every worker's leaderboards
+        await self._send([[book_id, None, None] for book_id in book_ids])
+
+    async def _send(self, events: List[list]):
+        for message in json_batches(events):
+            if self._hub is None:
+                self.receive(message)
+                continue
+            try:
+                await self._hub.broker.publish(TRENDING_CHANNEL, message)
+            except Exception:
+                # The votes are committed already; failing the request would not undo them.
+                # Count them here at least, the other workers catch up on their next rebuild.
+                logger.exception("Failed to publish trending events")
+                self.receive(message)
+
+    def receive(self, message: str):
+        for book_id, delta, ts in json.loads(message):
+            if delta is None:
+                self._forget(book_id)
+            else:
+                self.apply(book_id, delta, ts)
+
+    def rebuild(self, from_summary: bool = True):
+        now = self._bucket(time.time())
+        cutoff = now - self.retention + 1
+        buckets = defaultdict(lambda: defaultdict(int))
+        resume = cutoff
+        with self.bind.connect() as conn:
+            if from_summary:
+                # Rows of deleted books stay until their bucket ages out; the join skips them
+                rows = conn.execute(select(summary.c.bucket, summary.c.book_id, summary.c.votes)
+                                    .join(books, books.c.id == summary.c.book_id)
+                                    .where(summary.c.bucket >= cutoff)).all()
+                # The newest checkpointed bucket may have been partial, so it is recounted
+                resume = max((row.bucket for row in rows), default=cutoff)
+                for row in rows:
+                    if row.bucket < resume:
+                        buckets[row.bucket][row.book_id] = row.votes
+            since = datetime.fromtimestamp(resume * self.bucket_seconds, timezone.utc)
+            result = conn.execution_options(yield_per=REBUILD_BATCH_SIZE) \
+                .execute(select(votes.c.book_id, votes.c.created_at).where(votes.c.created_at >= since))
+            for book_id, created_at in result:
+                buckets[min(self._bucket(epoch(created_at)), now)][book_id] += 1
+
+        with self._lock:
+            self.buckets = buckets
+            self._now = now
+            self._dirty = {bucket for bucket in buckets if bucket >= resume}
+            for board in self.boards.values():
+                counts = defaultdict(int)
+                for bucket, bucket_counts in buckets.items():
+                    if bucket > now - board.span:
+                        for book_id, count in bucket_counts.items():
+                            counts[book_id] += count
+                board.reset(dict(counts))
+
+    def checkpoint(self) -> int:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshot = {bucket: dict(self.buckets.get(bucket, {})) for bucket in dirty}
+            cutoff = None if self._now is None else self._now - self.retention + 1
+        rows = [{"bucket": bucket, "book_id": book_id, "votes": count}
+                for bucket, counts in snapshot.items() for book_id, count in counts.items()]
+        try:
+            with self.bind.begin() as conn:
+                if conn.dialect.name == "postgresql":
+                    # Every worker checkpoints the same buckets; one at a time, or the
+                    # DELETE + INSERT pairs collide on the primary key
+                    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHECKPOINT_LOCK_KEY})
+                if snapshot:
+                    conn.execute(delete(summary).where(summary.c.bucket.in_(list(snapshot))))
+                if rows:
+                    conn.execute(insert(summary), rows)
+                if cutoff is not None:
+                    conn.execute(delete(summary).where(summary.c.bucket < cutoff))
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+            raise
+        return len(snapshot)
+
+    def start(self, hub):
+        self._hub = hub
+        hub.subscribe(TRENDING_CHANNEL, self.receive)
+        self._task = asyncio.create_task(self._run(settings.trending_checkpoint_interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.checkpoint)
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.checkpoint)
+            except Exception:
+                logger.exception("Failed to checkpoint trending counts")
+
+
+trending = Trending(engine, settings.trending_bucket_seconds, settings.trending_capacity)
+
+
+if __name__ == "__main__":
+    # python -m app.trending: recount every bucket from the vote table and rewrite the summary
+    trending.rebuild(from_summary=False)
+    with engine.begin() as conn:
+        conn.execute(delete(summary))
+    print(f"Checkpointed {trending.checkpoint()} trending buckets")
@@ -0,0 +1,143 @@
+import logging
+from typing import Dict, Optional
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import dialect_insert, engine
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 1000
+
+stats = models.UserStats.__table__
+books = models.Book.__table__
+votes = models.vote.__table__
+
+
+# Incremental updates. Each runs inside the caller's transaction, so the summary commits
+# or rolls back together with the change it describes. The most-voted book follows the
+# VoteCounter flush instead (update_top_books); top_book_id is NULL while votes_received
+# is positive when it has to be recomputed, which stats_for does on read.
+
+async def books_added(db: AsyncSession, owner_id: int, count: int, published: int):
+    stmt = dialect_insert(db, stats).values(user_id=owner_id, books=count, published=published)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[stats.c.user_id],
+        set_={"books": stats.c.books + stmt.excluded.books,
+              "published": stats.c.published + stmt.excluded.published}))
+
+
+async def book_removed(db: AsyncSession, owner_id: int, book_id: int, published: bool):
+    # Call before deleting the book. The row lock makes votes on it wait for the delete
+    # (their foreign key check conflicts with it), so none lands between count and delete.
+    await db.execute(select(books.c.id).where(books.c.id == book_id).with_for_update())
+    received = (await db.execute(select(func.count()).where(votes.c.book_id == book_id))).scalar()
+    await db.execute(update(stats).where(stats.c.user_id == owner_id).values(
+        books=stats.c.books - 1,
+        published=stats.c.published - int(published),
+        votes_received=stats.c.votes_received - received,
+        top_book_id=case((stats.c.top_book_id == book_id, None), else_=stats.c.top_book_id),
+        top_book_votes=case((stats.c.top_book_id == book_id, 0), else_=stats.c.top_book_votes)))
+
+
+async def publication_changed(db: AsyncSession, owner_id: int, published: bool):
+    await db.execute(update(stats).where(stats.c.user_id == owner_id)
+                     .values(published=stats.c.published + (1 if published else -1)))
+
+
+async def votes_changed(db: AsyncSession, deltas: Dict[int, int]):
+    # book_id -> vote delta; credited to each book's owner
+    params = [{"b_id": book_id, "delta": delta} for book_id, delta in deltas.items() if delta]
+    if not params:
+        return
+    owner = select(books.c.Owners_id).where(books.c.id == bindparam("b_id")).scalar_subquery()
+    await db.execute(update(stats).where(stats.c.user_id == owner)
+                     .values(votes_received=stats.c.votes_received + bindparam("delta")), params)
+
+
+def update_top_books(counts):
+    # VoteCounter listener, called from its flush thread with fresh (book_id, vote_count) pairs
+    owner = select(books.c.Owners_id).where(books.c.id == bindparam("b_id")).scalar_subquery()
+    count = bindparam("count")
+    params = [{"b_id": book_id, "count": vote_count} for book_id, vote_count in counts]
+    try:
+        with engine.begin() as conn:
+            # Another book overtook the current leader
+            conn.execute(update(stats).where(stats.c.user_id == owner, stats.c.top_book_id.is_not(None),
+                                             stats.c.top_book_id != bindparam("b_id"), stats.c.top_book_votes < count)
+                         .values(top_book_id=bindparam("b_id"), top_book_votes=count), params)
+            # The leader itself changed; if it lost votes another book may now lead
+            conn.execute(update(stats).where(stats.c.user_id == owner, stats.c.top_book_id == bindparam("b_id"))
+                         .values(top_book_id=case((count >= stats.c.top_book_votes, stats.c.top_book_id), else_=None),
+                                 top_book_votes=case((count >= stats.c.top_book_votes, count), else_=0)), params)
+    except Exception:
+        logger.exception("Failed to update most-voted books")
+
+
+def _top_book(owner_filter):
+    return select(books.c.Owners_id, books.c.id, func.count().label("votes")) \
+        .join(votes, votes.c.book_id == books.c.id).where(owner_filter) \
+        .group_by(books.c.Owners_id, books.c.id)
+
+
+async def stats_for(db: AsyncSession, user_id: int) -> Optional[dict]:
+    row = (await db.execute(select(stats).where(stats.c.user_id == user_id))).first()
+    if row is None:
+        return None
+    top_book_id, top_book_votes = row.top_book_id, row.top_book_votes
+    if top_book_id is None and row.votes_received > 0:
+        top = (await db.execute(_top_book(books.c.Owners_id == user_id)
+                                .order_by(func.count().desc(), books.c.id).limit(1))).first()
+        if top is not None:
+            top_book_id, top_book_votes = top.id, top.votes
+            await db.execute(update(stats).where(stats.c.user_id == user_id, stats.c.top_book_id.is_(None))
+                             .values(top_book_id=top_book_id, top_book_votes=top_book_votes))
+            await db.commit()
+    most_voted = None
+    if top_book_id is not None:
+        title = (await db.execute(select(books.c.Title).where(books.c.id == top_book_id))).scalar()
+        most_voted = {"id": top_book_id, "Title": title, "votes": top_book_votes}
+    return {"user_id": user_id, "books": row.books, "published": row.published,
+            "unpublished": row.books - row.published, "votes_received": row.votes_received,
+            "most_voted": most_voted}
+
+
+def rebuild(bind, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    # Recompute every row from Booksfastapi and vote, one range of user ids per
+    # transaction, so memory stays bounded by the books of batch_size users.
+    rebuilt = 0
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            user_ids = conn.execute(select(models.users.id).where(models.users.id > last_id)
+                                    .order_by(models.users.id).limit(batch_size)).scalars().all()
+            if not user_ids:
+                break
+            first, last_id = user_ids[0], user_ids[-1]
+            in_range = books.c.Owners_id.between(first, last_id)
+            if conn.dialect.name == "postgresql":
+                # Hold off concurrent increments for this range until it is rewritten
+                conn.execute(select(stats.c.user_id).where(stats.c.user_id.between(first, last_id)).with_for_update())
+
+            rows = {}
+            for owner_id, count, published in conn.execute(
+                    select(books.c.Owners_id, func.count(), func.sum(case((books.c.published, 1), else_=0)))
+                    .where(in_range).group_by(books.c.Owners_id)):
+                rows[owner_id] = {"user_id": owner_id, "books": count, "published": published or 0,
+                                  "votes_received": 0, "top_book_id": None, "top_book_votes": 0}
+            for owner_id, book_id, count in conn.execute(_top_book(in_range)):
+                row = rows[owner_id]
+                row["votes_received"] += count
+                if (count, -book_id) > (row["top_book_votes"], -(row["top_book_id"] or 0)):
+                    row["top_book_id"], row["top_book_votes"] = book_id, count
+
+            conn.execute(delete(stats).where(stats.c.user_id.between(first, last_id)))
+            if rows:
+                conn.execute(insert(stats), list(rows.values()))
+            rebuilt += len(rows)
+    return rebuilt
+
+
+if __name__ == "__main__":
+    # python -m app.user_stats: rebuild user_stats from scratch, e.g. from a cron job
+    print(f"Rebuilt user_stats for {rebuild(engine)} users")
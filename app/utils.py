@@ -6,4 +6,9 @@ def hash_password(password: str):
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password, hashed_password):
+    # Returns (valid, new_hash); new_hash is set when the stored hash uses a deprecated scheme or cost
+    return pwd_context.verify_and_update(plain_password, hashed_password)
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import bindparam, func, select, update
+from . import models
+from .config import settings
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+books = models.Book.__table__
+votes = models.vote.__table__
+
+
+class VoteCounter:
+    """Write-behind aggregator for Book.vote_count.
+
+    Vote handlers record +1/-1 deltas after their own commit; deltas for the same
+    book are coalesced in memory and applied in one batched UPDATE per flush.
+    reconcile() recounts every book from the vote table. Deltas still pending in
+    other workers when it runs are applied on top of the recount; they amount to at
+    most one flush interval of votes and the next reconcile settles them.
+    """
+
+    def __init__(self, bind, flush_interval: float, flush_threshold: int, reconcile_interval: int):
+        self.bind = bind
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.reconcile_interval = reconcile_interval
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.listeners = []
+
+    def add(self, book_id: int, delta: int):
+        with self._lock:
+            self._pending[book_id] += delta
+            size = len(self._pending)
+        if size >= self.flush_threshold:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(int)
+            params = [{"b_id": book_id, "delta": delta} for book_id, delta in pending.items() if delta]
+            if not params:
+                return 0
+            stmt = update(books).where(books.c.id == bindparam("b_id")) \
+                .values(vote_count=books.c.vote_count + bindparam("delta"))
+            try:
+                with self.bind.begin() as conn:
+                    conn.execute(stmt, params)
+                    counts = None
+                    if self.listeners:
+                        counts = conn.execute(select(books.c.id, books.c.vote_count)
+                                              .where(books.c.id.in_([p["b_id"] for p in params]))).all()
+            except Exception:
+                # Put the deltas back so they are retried on the next flush
+                with self._lock:
+                    for book_id, delta in pending.items():
+                        self._pending[book_id] += delta
+                raise
+            if counts:
+                for listener in self.listeners:
+                    listener([(row.id, row.vote_count) for row in counts])
+            return len(params)
+
+    def reconcile(self):
+        # Every pending delta is for a vote committed before it was added, so the full
+        # recount covers it and it can be dropped.
+        with self._flush_lock:
+            with self._lock:
+                self._pending = defaultdict(int)
+            counted = select(func.count()).where(votes.c.book_id == books.c.id).scalar_subquery()
+            stmt = update(books).where(books.c.vote_count != counted).values(vote_count=counted)
+            if not self.listeners:
+                with self.bind.begin() as conn:
+                    return conn.execute(stmt).rowcount
+            with self.bind.begin() as conn:
+                corrected = [tuple(row) for row in conn.execute(stmt.returning(books.c.id, books.c.vote_count))]
+            # Corrections reach the listeners like any flushed change
+            if corrected:
+                for listener in self.listeners:
+                    listener(corrected)
+            return len(corrected)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="vote-counter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        last_reconcile = time.monotonic()
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if self.reconcile_interval and time.monotonic() - last_reconcile >= self.reconcile_interval:
+                    fixed = self.reconcile()
+                    last_reconcile = time.monotonic()
+                    if fixed:
+                        logger.info("Reconciled vote_count for %d books", fixed)
+            except Exception:
+                logger.exception("Failed to flush vote counts")
+
+
+vote_counter = VoteCounter(engine, settings.vote_flush_interval, settings.vote_flush_threshold,
+                           settings.vote_reconcile_interval)
+
+
+if __name__ == "__main__":
+    # python -m app.votes: recompute every Book.vote_count from the vote table
+    print(f"Reconciled vote_count for {vote_counter.reconcile()} books")
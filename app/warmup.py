@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import time
+from sqlalchemy import select, text
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal, async_engine
+
+logger = logging.getLogger(__name__)
+
+
+async def open_pool_connections(count: int):
+    # Hold `count` connections at once so the pool really opens them, then hand them back
+    if not hasattr(async_engine.pool, "size"):
+        # Single-connection pools (in-memory SQLite) have nothing to pre-open
+        count = 1
+    opened = 0
+    all_open = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold():
+        nonlocal opened
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            opened += 1
+            if opened == count:
+                all_open.set()
+            await release.wait()
+
+    tasks = [asyncio.create_task(hold()) for _ in range(count)]
+    waiter = asyncio.create_task(all_open.wait())
+    # A holder only finishes before release if its connection failed
+    await asyncio.wait([waiter, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    waiter.cancel()
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+async def precompile_queries():
+    # Executing the hot statements once fills SQLAlchemy's compiled cache and asyncpg's
+    # prepared statement cache for the connections opened above.
+    from .routers.Book import _book_listing
+    async with AsyncSessionLocal() as db:
+        await db.execute(_book_listing(None, None, None, None, None).limit(1))
+        await db.execute(select(models.Book).where(models.Book.id == 0))
+        await db.execute(select(models.users).where(models.users.id == 0))
+        await db.execute(select(models.users).where(models.users.email == ""))
+
+
+async def warm_up():
+    start = time.perf_counter()
+    await open_pool_connections(settings.warmup_connections or settings.db_pool_size)
+    await precompile_queries()
+
+    from .rendering import renderer
+    from .routers import pages
+    await renderer.books_page(pages.load_first_page)
+    logger.info("Worker warmed up in %.0f ms", (time.perf_counter() - start) * 1000)
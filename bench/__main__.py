@@ -0,0 +1,75 @@
+# Reproducible load tests for the auth, user, Book and likes routers.
+#
+#   python -m bench seed --users 1000 --books 100000 --votes 500000 > layout.json
+#   python -m bench run --url http://127.0.0.1:8000 --layout layout.json --rps 200 --duration 60 > result.json
+#   python -m bench compare result.json baseline.json --threshold 10
+#
+# The server under test must use the same database as the seed step (DATABASE_URL) and
+# run with RATE_LIMIT_ENABLED=false, or logins and votes from this one client turn into 429s.
+import argparse
+import asyncio
+import json
+import sys
+
+from bench import env
+
+
+def parse_mix(value: str):
+    mix = {}
+    for part in value.split(","):
+        op, _, weight = part.partition("=")
+        mix[op.strip()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="populate the database and print its layout as JSON")
+    seed_parser.add_argument("--database-url")
+    seed_parser.add_argument("--users", type=int, default=1000)
+    seed_parser.add_argument("--books", type=int, default=10000)
+    seed_parser.add_argument("--votes", type=int, default=50000)
+    seed_parser.add_argument("--seed", type=int, default=42)
+
+    run_parser = commands.add_parser("run", help="drive a mixed workload and print results as JSON")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--layout", required=True, help="JSON written by the seed command")
+    run_parser.add_argument("--rps", type=float, default=100)
+    run_parser.add_argument("--duration", type=float, default=30)
+    run_parser.add_argument("--mix", type=parse_mix, help="e.g. login=1,list=6,get_book=6,get_user=2,vote=4,bulk_create=0.2")
+    run_parser.add_argument("--seed", type=int, default=42)
+
+    compare_parser = commands.add_parser("compare", help="exit 1 if RESULT regressed against BASELINE")
+    compare_parser.add_argument("result")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        env.configure(args.database_url)
+        from bench.seed import seed
+        print(json.dumps(seed(args.users, args.books, args.votes, args.seed)))
+    elif args.command == "run":
+        from bench.workload import DEFAULT_MIX, run
+        with open(args.layout) as f:
+            layout = json.load(f)
+        result = asyncio.run(run(args.url, layout, args.rps, args.duration, args.mix or DEFAULT_MIX, args.seed))
+        print(json.dumps(result, indent=2))
+    else:
+        from bench.compare import compare
+        with open(args.result) as f:
+            result = json.load(f)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print("no regressions")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Stream generated books to /books/import and report rows/sec.
+#   python -m bench.bulk_import --url http://127.0.0.1:8000 --token <jwt> --rows 50000 --min-rows-per-sec 20000
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+import httpx
+
+
+def ndjson_body(rows):
+    for i in range(rows):
+        yield (json.dumps({"Title": f"Imported {i}", "Author": f"Author {i % 1000}", "published": i % 2 == 0}) + "\n").encode()
+
+
+def csv_body(rows):
+    yield b"Title,Author,published\n"
+    for i in range(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow([f"Imported {i}", f"Author {i % 1000}", "true" if i % 2 == 0 else "false"])
+        yield buffer.getvalue().encode()
+
+
+def main(args):
+    body = csv_body(args.rows) if args.format == "csv" else ndjson_body(args.rows)
+    content_type = "text/csv" if args.format == "csv" else "application/x-ndjson"
+    headers = {"Authorization": f"Bearer {args.token}"}
+    start = time.perf_counter()
+    response = httpx.post(f"{args.url}/books/import", content=body, timeout=None,
+                          headers={**headers, "Content-Type": content_type})
+    response.raise_for_status()
+    summary = response.json()
+    # The import runs after the upload is accepted; poll the job until it settles
+    while summary["status"] == "running":
+        time.sleep(0.05)
+        summary = httpx.get(f"{args.url}/books/import/{summary['job_id']}", headers=headers).raise_for_status().json()
+    elapsed = time.perf_counter() - start
+    rate = summary["rows_imported"] / elapsed
+    print(f"{args.format}: imported {summary['rows_imported']} rows, rejected {summary['rows_rejected']}, "
+          f"{len(summary['chunks'])} chunks in {elapsed:.2f}s = {rate:,.0f} rows/s")
+    if args.min_rows_per_sec and rate < args.min_rows_per_sec:
+        print(f"below target of {args.min_rows_per_sec:,.0f} rows/s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--min-rows-per-sec", type=float, default=0)
+    main(parser.parse_args())
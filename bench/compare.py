@@ -0,0 +1,22 @@
+# Flag latency and throughput regressions of a run against a stored baseline.
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(result: dict, baseline: dict, threshold_pct: float):
+    regressions = []
+    sections = {"total": (result["total"], baseline["total"])}
+    for op, stats in result["ops"].items():
+        if op in baseline["ops"]:
+            sections[op] = (stats, baseline["ops"][op])
+
+    for name, (current, previous) in sections.items():
+        for key in LATENCY_KEYS:
+            if previous[key] and current[key] > previous[key] * (1 + threshold_pct / 100):
+                regressions.append(f"{name}.{key}: {previous[key]:.1f} -> {current[key]:.1f}")
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - threshold_pct / 100):
+            regressions.append(f"{name}.throughput: {previous['throughput']:.1f} -> {current['throughput']:.1f}")
+        previous_error_rate = previous["errors"] / max(previous["count"] + previous["errors"], 1)
+        current_error_rate = current["errors"] / max(current["count"] + current["errors"], 1)
+        if current_error_rate > previous_error_rate + threshold_pct / 100:
+            regressions.append(f"{name}.error_rate: {previous_error_rate:.2%} -> {current_error_rate:.2%}")
+    return regressions
@@ -0,0 +1,70 @@
+# Compare requests/sec of the sync Session (run in the AnyIO threadpool, as sync
+# FastAPI handlers are) against AsyncSession for the book listing query.
+#   DATABASE_URL=postgresql://user:pw@localhost/books python -m bench.db_modes
+#   DATABASE_URL=sqlite:///bench.db python -m bench.db_modes --seed 10000
+import argparse
+import asyncio
+import time
+
+from bench import env
+
+env.configure("sqlite:///bench.db")
+
+from anyio import to_thread
+from sqlalchemy import insert
+
+from app import models
+from app.database import AsyncSessionLocal, SessionLocal, async_engine, engine
+from app.routers.Book import _book_listing
+
+
+def seed(count):
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        owner = models.users(name="bench", email="bench@example.com", password="x")
+        db.add(owner)
+        db.flush()
+        db.execute(insert(models.Book), [
+            {"Title": f"Book {i}", "Author": f"Author {i % 100}", "Owners_id": owner.id} for i in range(count)
+        ])
+        db.commit()
+
+
+def sync_request(limit):
+    with SessionLocal() as db:
+        return db.execute(_book_listing(None, None, None, None, None).limit(limit)).all()
+
+
+async def async_request(limit):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(_book_listing(None, None, None, None, None).limit(limit))).all()
+
+
+async def drive(label, call, requests, concurrency):
+    queue = iter(range(requests))
+
+    async def worker():
+        for _ in queue:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<6} {requests / elapsed:>10,.0f} req/s  ({requests} requests, concurrency {concurrency})")
+
+
+async def main(args):
+    if args.seed:
+        seed(args.seed)
+    await drive("sync", lambda: to_thread.run_sync(sync_request, args.limit), args.requests, args.concurrency)
+    await drive("async", lambda: async_request(args.limit), args.requests, args.concurrency)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0, help="create tables and insert this many books first")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,18 @@
+import os
+
+# Settings the app requires at import time; real values come from the environment or .env
+DEFAULTS = {
+    "DATABASE_HOST": "localhost", "DATABASE_PORT": "5432", "DATABASE_USERNAME": "bench",
+    "DATABASE_PASSWORD": "bench", "DATABASE_NAME": "bench", "SECRET_KEY": "bench-secret",
+    "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    # Benchmarks drive every login and vote from one IP and one handful of users; the
+    # limiter would turn them into 429s. Set RATE_LIMIT_ENABLED=true to measure it.
+    "RATE_LIMIT_ENABLED": "false",
+}
+
+
+def configure(database_url=None):
+    if database_url:
+        os.environ.setdefault("DATABASE_URL", database_url)
+    for key, value in DEFAULTS.items():
+        os.environ.setdefault(key, value)
@@ -0,0 +1,39 @@
+# Compare cached and uncached JWT verification throughput.
+#   python -m bench.jwt_verify [iterations]
+import sys
+import time
+
+from bench import env
+
+env.configure()
+
+from fastapi import HTTPException
+
+from app import oauth2
+
+
+def run(label, iterations, token):
+    error = HTTPException(status_code=401)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        oauth2.decode_access_token(token, error)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {iterations / elapsed:>12,.0f} verifications/s  {elapsed / iterations * 1e6:8.2f} us/op")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    token = oauth2.create_access_token({"user_id": 1})
+    print(f"algorithm={oauth2.ALGORITHM} asymmetric={oauth2.key_ring is not None}")
+
+    max_size = oauth2.token_cache.max_size
+    oauth2.token_cache.max_size = 0
+    oauth2.token_cache.clear()
+    run("uncached", iterations, token)
+
+    oauth2.token_cache.max_size = max_size
+    run("cached", iterations, token)
+
+
+if __name__ == "__main__":
+    main()
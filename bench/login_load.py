@@ -0,0 +1,60 @@
+# Saturate /login_new and measure the latency of the book listing meanwhile.
+#   python -m bench.login_load --url http://127.0.0.1:8000 --email a@b.c --password secret
+# Start the server with RATE_LIMIT_ENABLED=false; otherwise the login limiter answers most
+# of the storm with 429s and the run measures the limiter instead of bcrypt.
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from bench.report import percentile
+
+
+async def login(client, args):
+    response = await client.post("/login_new", data={"username": args.email, "password": args.password})
+    return response
+
+
+async def login_loop(client, args, deadline, codes):
+    while time.monotonic() < deadline:
+        response = await login(client, args)
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+
+async def probe_loop(client, token, deadline, latencies):
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/", params={"limit": 50}, headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.logins + args.probes)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        response = await login(client, args)
+        response.raise_for_status()
+        token = response.json()["access_token"]
+
+        for label, logins in (("idle", 0), ("login storm", args.logins)):
+            deadline = time.monotonic() + args.duration
+            codes, latencies = {}, []
+            await asyncio.gather(*[login_loop(client, args, deadline, codes) for _ in range(logins)],
+                                 *[probe_loop(client, token, deadline, latencies) for _ in range(args.probes)])
+            print(f"{label:<12} listing p50={percentile(latencies, 50):7.1f}ms p99={percentile(latencies, 99):7.1f}ms "
+                  f"mean={statistics.fmean(latencies) if latencies else 0:7.1f}ms n={len(latencies)} logins={codes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=64, help="concurrent login loops")
+    parser.add_argument("--probes", type=int, default=4, help="concurrent listing loops")
+    parser.add_argument("--duration", type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
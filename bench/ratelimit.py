@@ -0,0 +1,64 @@
+# Per-check overhead of the token-bucket rate limiter, single-threaded and with threads
+# contending on the sharded locks.
+#   python -m bench.ratelimit [--checks 200000] [--keys 10000] [--threads 8]
+import argparse
+import asyncio
+import threading
+import time
+
+from bench import env
+
+env.configure()
+
+from app.ratelimit import Limit, MemoryBuckets, RateLimiter
+
+# Generous enough that every check is allowed and takes the common path
+LIMIT = Limit(burst=1e9, rate=1e9)
+
+
+def single(buckets, keys, checks):
+    start = time.perf_counter()
+    for i in range(checks):
+        buckets.take(keys[i % len(keys)], LIMIT)
+    return time.perf_counter() - start
+
+
+def threaded(buckets, keys, checks, threads):
+    per_thread = checks // threads
+    workers = [threading.Thread(target=single, args=(buckets, keys[n::threads] or keys, per_thread))
+               for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+async def through_limiter(keys, checks):
+    # The path a request takes: limit lookup, key formatting and the awaited backend call
+    limiter = RateLimiter(MemoryBuckets(), {"bench": "1000000000/1"})
+    start = time.perf_counter()
+    for i in range(checks):
+        await limiter.check("bench", keys[i % len(keys)])
+    return time.perf_counter() - start
+
+
+def report(label, seconds, checks):
+    print(f"{label:<32} {seconds / checks * 1e6:7.3f} us/check  {checks / seconds:12,.0f} checks/s")
+
+
+def main(args):
+    keys = [f"user:{n}" for n in range(args.keys)]
+    report("MemoryBuckets.take", single(MemoryBuckets(), keys, args.checks), args.checks)
+    report(f"MemoryBuckets.take x{args.threads} threads",
+           threaded(MemoryBuckets(), keys, args.checks, args.threads), args.checks)
+    report("RateLimiter.check", asyncio.run(through_limiter(keys, args.checks)), args.checks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=8)
+    main(parser.parse_args())
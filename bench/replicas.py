@@ -0,0 +1,62 @@
+# Exercise replica routing against SQLite stand-ins: a primary, two replicas and one
+# replica that cannot be reached. Reports how reads are spread, that a caller who just
+# wrote is kept on the primary, and that the unreachable replica is ejected.
+#   python -m bench.replicas [--reads 1000] [--strategy round_robin|least_connections]
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+
+from bench import env
+
+directory = tempfile.mkdtemp()
+paths = {name: os.path.join(directory, f"{name}.db") for name in ("primary", "replica1", "replica2")}
+env.configure(f"sqlite:///{paths['primary']}")
+
+from sqlalchemy import text
+
+from app.replicas import ReplicaSet
+
+
+def create(name):
+    with sqlite3.connect(paths[name]) as conn:
+        conn.execute("CREATE TABLE whoami (name TEXT)")
+        conn.execute("INSERT INTO whoami VALUES (?)", (name,))
+
+
+async def read(replicas, key=None, concurrent=1):
+    async def one():
+        async with replicas.session(key) as db:
+            return (await db.execute(text("SELECT name FROM whoami"))).scalar()
+    return await asyncio.gather(*(one() for _ in range(concurrent)))
+
+
+async def main(args):
+    for name in paths:
+        create(name)
+    urls = [f"sqlite:///{paths['replica1']}", f"sqlite:///{paths['replica2']}",
+            f"sqlite:///{os.path.join(directory, 'missing', 'replica3.db')}"]
+    replicas = ReplicaSet(urls, args.strategy, read_your_writes=1.0)
+    await replicas.check_all()
+    print("healthy:", [replica.healthy for replica in replicas.replicas])
+
+    served = Counter()
+    for _ in range(args.reads // args.concurrency):
+        served.update(await read(replicas, concurrent=args.concurrency))
+    print("reads served by:", dict(served))
+
+    replicas.mark_write(b"writer")
+    print("writer within window reads from:", (await read(replicas, b"writer"))[0])
+    await asyncio.sleep(1.1)
+    print("writer after window reads from:", (await read(replicas, b"writer"))[0])
+    await replicas.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--strategy", default="round_robin")
+    asyncio.run(main(parser.parse_args()))
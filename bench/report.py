@@ -0,0 +1,20 @@
+import statistics
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def summarize(latencies_ms, errors, elapsed):
+    return {
+        "count": len(latencies_ms),
+        "errors": errors,
+        "throughput": len(latencies_ms) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(latencies_ms) if latencies_ms else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+    }
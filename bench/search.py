@@ -0,0 +1,73 @@
+# Generate a large catalog and measure /books/search latency.
+#   DATABASE_URL=postgresql://user:pw@localhost/bench python -m bench.search --books 1000000
+#   python -m bench.search --books 1000000        (SQLite + in-process inverted index)
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+from bench import env
+
+env.configure(f"sqlite:///{tempfile.mkdtemp()}/search.db")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import insert
+
+from app import models
+from app.database import async_engine, engine
+from app.routers import Book
+from app.search import search_index
+from bench.report import percentile
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "sho", "vel", "dar", "quin", "bre", "tor", "nel", "zu", "fa", "gor"]
+BATCH_SIZE = 20000
+
+
+def word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def seed(books, rng):
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.users).values(id=1, name="bench", email="bench@example.com", password="x"))
+    for start in range(0, books, BATCH_SIZE):
+        rows = [{"Title": " ".join(word(rng) for _ in range(rng.randint(1, 5))),
+                 "Author": f"{word(rng)} {word(rng)}", "Owners_id": 1}
+                for _ in range(min(BATCH_SIZE, books - start))]
+        with engine.begin() as conn:
+            conn.execute(insert(models.Book), rows)
+    print(f"seeded {books:,} books")
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    seed(args.books, rng)
+    start = time.perf_counter()
+    search_index.rebuild(engine)
+    if search_index.enabled:
+        print(f"built inverted index in {time.perf_counter() - start:.1f}s")
+
+    app = FastAPI()
+    app.include_router(Book.app)
+    queries = [word(rng)[:rng.randint(2, 6)] if i % 2 else f"{word(rng)} {word(rng)[:3]}" for i in range(args.queries)]
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for q in queries:
+            start = time.perf_counter()
+            response = await client.get("/books/search", params={"q": q, "limit": 20})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+    await async_engine.dispose()
+    print(f"{len(queries)} queries: p50={percentile(latencies, 50):.2f}ms p95={percentile(latencies, 95):.2f}ms "
+          f"p99={percentile(latencies, 99):.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
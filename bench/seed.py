@@ -0,0 +1,63 @@
+# Fill the database named by DATABASE_URL (or the usual settings) with synthetic data.
+import random
+
+from sqlalchemy import func, insert, select, text
+
+from app import models, utils
+from app.database import engine
+from app.votes import vote_counter
+
+PASSWORD = "bench-password"
+BATCH_SIZE = 10000
+
+
+def email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(users: int, books: int, votes: int, seed: int = 42):
+    rng = random.Random(seed)
+    models.Base.metadata.create_all(bind=engine)
+    # One bcrypt hash shared by every bench user keeps seeding fast
+    password = utils.hash_password(PASSWORD)
+
+    with engine.begin() as conn:
+        first_user = (conn.execute(select(func.max(models.users.id))).scalar() or 0) + 1
+        for batch in _batched({"id": first_user + i, "name": f"bench {i}", "email": email(first_user + i), "password": password}
+                              for i in range(users)):
+            conn.execute(insert(models.users), batch)
+
+        first_book = (conn.execute(select(func.max(models.Book.id))).scalar() or 0) + 1
+        for batch in _batched({"id": first_book + i, "Title": f"Bench book {i}", "Author": f"Author {rng.randrange(1000)}",
+                               "published": rng.random() < 0.8, "Owners_id": first_user + rng.randrange(users)}
+                              for i in range(books)):
+            conn.execute(insert(models.Book), batch)
+
+        pairs = set()
+        target = min(votes, users * books)
+        while len(pairs) < target:
+            pairs.add((first_user + rng.randrange(users), first_book + rng.randrange(books)))
+        for batch in _batched({"user_id": user_id, "book_id": book_id} for user_id, book_id in pairs):
+            conn.execute(insert(models.vote), batch)
+
+        if conn.dialect.name == "postgresql":
+            # Explicit ids leave the SERIAL sequences behind; move them past the seeded rows
+            # so later inserts (/register, /newpost, imports) do not collide
+            for table in (models.users.__table__, models.Book.__table__):
+                name = conn.dialect.identifier_preparer.format_table(table)
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence(:name, 'id'), (SELECT max(id) FROM {name}))"),
+                             {"name": name})
+
+    vote_counter.reconcile()
+    return {"first_user": first_user, "users": users, "first_book": first_book, "books": books, "votes": len(pairs)}
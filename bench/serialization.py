@@ -0,0 +1,85 @@
+# Serialization cost of a book listing response, rows already fetched:
+#   pydantic   - BookInDB per row, as a response_model route does, then jsonable_encoder + json
+#   dicts      - hand-built dicts through jsonable_encoder + json, the previous get_books path
+#   layout     - RowLayout dicts encoded by orjson, the current path
+#   python -m bench.serialization [--sizes 1000 10000 100000]
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from bench import env
+
+env.configure()
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+
+from app import models, schemas
+from app.routers.Book import BOOK_LAYOUT, _book_listing
+from app.serializers import dumps
+
+books_adapter = TypeAdapter(List[schemas.BookInDB])
+
+
+def fetch_rows(count):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine, tables=[models.users.__table__, models.Book.__table__])
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(models.users), [{"id": 1, "name": "bench", "email": "bench@example.com", "password": "x"}])
+        conn.execute(insert(models.Book), [
+            {"Title": f"Book {i}", "Author": f"Author {i % 100}", "created_at": start + timedelta(seconds=i),
+             "Owners_id": 1, "vote_count": i % 50} for i in range(count)
+        ])
+        return conn.execute(_book_listing(None, None, None, None, None)).all()
+
+
+def hand_built(row):
+    book = row._asdict()
+    book["Owners"] = {"id": book["Owners_id"], "name": book.pop("owner_name")}
+    return book
+
+
+def pydantic_path(rows):
+    books = books_adapter.validate_python([hand_built(row) for row in rows])
+    return json.dumps(jsonable_encoder(books_adapter.dump_python(books, mode="json")),
+                      ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dicts_path(rows):
+    return json.dumps(jsonable_encoder({"books": [hand_built(row) for row in rows]}),
+                      ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def layout_path(rows):
+    return dumps({"books": BOOK_LAYOUT.rows(rows)})
+
+
+def timed(fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best, len(body)
+
+
+def main(args):
+    for size in args.sizes:
+        rows = fetch_rows(size)
+        repeat = max(3, 100000 // size)
+        results = {name: timed(fn, rows, repeat) for name, fn in
+                   (("pydantic", pydantic_path), ("dicts", dicts_path), ("layout", layout_path))}
+        baseline = results["pydantic"][0]
+        for name, (seconds, length) in results.items():
+            print(f"{size:>7} rows  {name:<9} {seconds * 1000:9.2f} ms  {length / 1024:9.0f} KiB  "
+                  f"{baseline / seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    main(parser.parse_args())
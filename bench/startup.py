@@ -0,0 +1,67 @@
+# Measure cold-start cost: per-module import time of the app and time to first request.
+#   python -m bench.startup [--top 25] [--port 8765]
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench import env
+
+
+def import_times(module: str):
+    # -X importtime prints "import time: self [us] | cumulative | imported package" to stderr
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=os.environ.copy(), check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.removeprefix("import time:").split("|")]
+        rows.append((int(cumulative_us), int(self_us), name))
+    return rows
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request(port: int, path: str, timeout: float = 60.0):
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "--factory", "app.main:create_app",
+                               "--port", str(port), "--log-level", "warning"], env=os.environ.copy())
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}{path}", timeout=1).status_code < 500:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                time.sleep(0.02)
+        raise TimeoutError(f"no response from {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(args):
+    env.configure()
+    for module in ("app.main", "app.routers.Book"):
+        rows = import_times(module)
+        total = max(cumulative for cumulative, _, _ in rows)
+        print(f"import {module}: {total / 1000:.1f} ms")
+        for cumulative, self_us, name in sorted(rows, reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms cumulative {self_us / 1000:8.1f} ms self  {name}")
+    print(f"time to first request: {time_to_first_request(args.port or free_port(), args.path) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--path", default="/login")
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+# Compare the trending leaderboard with the GROUP BY it replaces: per-request cost of
+# the query against vote, versus the in-memory read and the per-vote update.
+#   python -m bench.trending [--users 2000 --books 5000 --votes 200000]
+#   DATABASE_URL=postgresql://user:pw@localhost/books python -m bench.trending
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from bench import env
+
+env.configure("sqlite:///bench_trending.db")
+
+from sqlalchemy import func, select
+
+from app import models
+from app.database import engine
+from app.trending import trending
+from bench.seed import seed
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def group_by_top(limit):
+    since = datetime.now(timezone.utc) - timedelta(hours=24)
+    with engine.connect() as conn:
+        return conn.execute(select(models.vote.book_id, func.count().label("votes"))
+                            .where(models.vote.created_at >= since)
+                            .group_by(models.vote.book_id)
+                            .order_by(func.count().desc(), models.vote.book_id)
+                            .limit(limit)).all()
+
+
+def main(args):
+    if not args.skip_seed:
+        print("seeded", seed(args.users, args.books, args.votes))
+
+    start = time.perf_counter()
+    trending.rebuild(from_summary=False)
+    print(f"rebuild from vote            {(time.perf_counter() - start) * 1000:10.1f} ms")
+    print(f"GROUP BY top {args.limit:<4}            {timed(lambda: group_by_top(args.limit), 20) * 1e3:10.3f} ms/request")
+    print(f"leaderboard top {args.limit:<4}         {timed(lambda: trending.top('24h', args.limit), 10000) * 1e6:10.3f} us/request")
+
+    rng = random.Random(1)
+    now = time.time()
+    book_ids = [rng.randrange(1, args.books + 1) for _ in range(100000)]
+    start = time.perf_counter()
+    for book_id in book_ids:
+        trending.apply(book_id, 1, now)
+    print(f"apply one vote               {(time.perf_counter() - start) / len(book_ids) * 1e6:10.3f} us/vote")
+    print(f"leaderboard top after votes  {timed(lambda: trending.top('24h', args.limit), 10000) * 1e6:10.3f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--votes", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--skip-seed", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+# Open-loop mixed workload: requests are started on a fixed schedule at the target
+# rate whether or not earlier ones finished, so server slowdowns show up as latency.
+import asyncio
+import random
+import time
+
+import httpx
+
+from bench.report import summarize
+from bench.seed import PASSWORD, email
+
+DEFAULT_MIX = {"login": 1, "list": 6, "get_book": 6, "get_user": 2, "vote": 4, "bulk_create": 0.2}
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, layout: dict, rng: random.Random):
+        self.client = client
+        self.layout = layout
+        self.rng = rng
+        self.tokens = []
+
+    def _user(self):
+        return self.layout["first_user"] + self.rng.randrange(self.layout["users"])
+
+    def _book(self):
+        return self.layout["first_book"] + self.rng.randrange(self.layout["books"])
+
+    def _auth(self):
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+    async def login(self):
+        response = await self.client.post("/login_new", data={"username": email(self._user()), "password": PASSWORD})
+        if response.status_code == 200:
+            self.tokens.append(response.json()["access_token"])
+        return response
+
+    async def list(self):
+        return await self.client.post("/", params={"limit": 50}, headers=self._auth())
+
+    async def get_book(self):
+        return await self.client.get(f"/books/{self._book()}")
+
+    async def get_user(self):
+        return await self.client.get(f"/users/{self._user()}")
+
+    async def vote(self):
+        return await self.client.post("/vote", json={"book_id": self._book(), "dir": self.rng.randint(0, 1)},
+                                      headers=self._auth())
+
+    async def bulk_create(self):
+        books = [{"Title": f"Bulk {self.rng.random()}", "Author": "Bench", "published": True} for _ in range(100)]
+        return await self.client.post("/newpost", json=books, headers=self._auth())
+
+
+# Conflicts (409) and "not voted yet" (400) are expected outcomes of random voting
+EXPECTED = {"vote": {200, 400, 409}}
+
+
+async def run(url: str, layout: dict, rps: float, duration: float, mix: dict, seed: int = 42, max_in_flight: int = 1000):
+    rng = random.Random(seed)
+    ops = list(mix)
+    weights = [mix[op] for op in ops]
+    latencies = {op: [] for op in ops}
+    errors = {op: 0 for op in ops}
+    dropped = 0
+
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        workload = Workload(client, layout, rng)
+        for _ in range(min(20, layout["users"])):
+            response = await workload.login()
+            if response.status_code == 429:
+                raise SystemExit("login was rate limited; start the server with RATE_LIMIT_ENABLED=false")
+            response.raise_for_status()
+
+        in_flight = set()
+
+        async def issue(op):
+            start = time.perf_counter()
+            try:
+                response = await getattr(workload, op)()
+                ok = response.status_code in EXPECTED.get(op, {200, 201, 202})
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies[op].append((time.perf_counter() - start) * 1000)
+            else:
+                errors[op] += 1
+
+        interval = 1.0 / rps
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                dropped += 1
+            else:
+                task = asyncio.create_task(issue(rng.choices(ops, weights)[0]))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            next_at += interval
+        await asyncio.gather(*in_flight)
+        elapsed = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "config": {"url": url, "rps": rps, "duration": duration, "mix": mix, "seed": seed, "layout": layout},
+        "dropped": dropped,
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "ops": {op: summarize(latencies[op], errors[op], elapsed) for op in ops},
+    }
@@ -0,0 +1,60 @@
+# Measure broadcast fan-out latency as the number of connected sockets grows.
+#   python -m bench.ws_fanout --url ws://127.0.0.1:8000/ws/books/1 --connections 100 1000 5000
+import argparse
+import asyncio
+import json
+import time
+
+import websockets
+
+from bench.report import percentile
+
+
+async def receiver(socket, latencies, expected, done):
+    received = 0
+    async for raw in socket:
+        message = json.loads(raw)
+        latencies.append((time.time() - message["sent_at"]) * 1000)
+        received += 1
+        if received == expected:
+            break
+    done.release()
+
+
+async def run(url, connections, messages, interval):
+    sockets = []
+    for _ in range(connections):
+        sockets.append(await websockets.connect(url, max_queue=messages + 1))
+    latencies = []
+    done = asyncio.Semaphore(0)
+    tasks = [asyncio.create_task(receiver(socket, latencies, messages, done)) for socket in sockets]
+
+    async with websockets.connect(url) as sender:
+        for i in range(messages):
+            await sender.send(json.dumps({"seq": i, "sent_at": time.time()}))
+            await asyncio.sleep(interval)
+        try:
+            await asyncio.wait_for(asyncio.gather(*[done.acquire() for _ in sockets]), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*[socket.close() for socket in sockets], return_exceptions=True)
+    expected = connections * messages
+    print(f"{connections:>6} sockets: delivered {len(latencies)}/{expected} "
+          f"p50={percentile(latencies, 50):7.1f}ms p99={percentile(latencies, 99):7.1f}ms max={max(latencies, default=0):7.1f}ms")
+
+
+async def main(args):
+    for connections in args.connections:
+        await run(args.url, connections, args.messages, args.interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/books/1")
+    parser.add_argument("--connections", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+import itertools
+import os
+import tempfile
+
+DATABASE = os.path.join(tempfile.mkdtemp(), "test.db")
+
+# app.config requires these at import time
+for key, value in {
+    "DATABASE_URL": f"sqlite:///{DATABASE}", "DATABASE_HOST": "localhost", "DATABASE_PORT": "5432",
+    "DATABASE_USERNAME": "test", "DATABASE_PASSWORD": "test", "DATABASE_NAME": "test",
+    "SECRET_KEY": "test-secret", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "RATE_LIMIT_ENABLED": "false",
+}.items():
+    os.environ.setdefault(key, value)
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: starts real server processes; deselect with -m 'not slow'")
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite leaves ON DELETE CASCADE off unless asked, Postgres always applies it
+    if "sqlite" in type(dbapi_connection).__module__:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.database import Base, engine
+    from app.main import create_app
+    Base.metadata.create_all(engine)
+    with TestClient(create_app()) as client:
+        yield client
+
+
+_users = itertools.count(1)
+
+
+@pytest.fixture
+def login(client):
+    # Registers a fresh user and returns (user id, auth headers)
+    def login():
+        email = f"user{next(_users)}@example.com"
+        response = client.post("/register", json={"name": email.split("@")[0], "email": email, "password": "secret"})
+        response.raise_for_status()
+        token = client.post("/login_new", data={"username": email, "password": "secret"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        return client.get("/users/me", headers=headers).json()["id"], headers
+    return login
+
+
+class SharedBroker:
+    # One broker in front of several hubs, as Redis or Postgres is for several workers
+    def __init__(self):
+        self.subscribers = []
+
+    async def start(self, on_message):
+        self.subscribers.append(on_message)
+
+    async def publish(self, channel, message):
+        for on_message in self.subscribers:
+            on_message(channel, message)
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def shared_broker():
+    return SharedBroker()
@@ -0,0 +1,34 @@
+import asyncio
+import time
+from jose import jwt
+from app import oauth2
+from app.hub import Hub
+from app.oauth2 import TokenCache
+
+
+def test_logout_revokes_token(client, login):
+    _, headers = login()
+    assert client.get("/users/me", headers=headers).status_code == 200
+    assert client.post("/logout", headers=headers).status_code == 204
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+
+def test_token_without_exp_is_accepted(client, login):
+    user_id, _ = login()
+    token = jwt.encode({"user_id": user_id}, oauth2.SECRET_KEY, algorithm=oauth2.ALGORITHM)
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+
+def test_revocations_reach_other_workers(shared_broker):
+    async def scenario():
+        caches = []
+        for _ in range(2):
+            hub = Hub(shared_broker, 8)
+            await hub.start()
+            cache = TokenCache(100, 60)
+            cache.start(hub)
+            caches.append(cache)
+        await caches[0].revoke_everywhere(b"\x01" * 32, time.time() + 60)
+        return caches[1].is_revoked(b"\x01" * 32)
+
+    assert asyncio.run(scenario())
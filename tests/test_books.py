@@ -0,0 +1,26 @@
+from sqlalchemy import func, select
+from app import models
+from app.database import engine
+
+
+def new_book(client, headers, title="Dune"):
+    response = client.post("/create_new_book", json={"Title": title, "Author": "Herbert", "published": True}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_delete_voted_book(client, login):
+    owner_id, owner = login()
+    _, voter = login()
+    book_id = new_book(client, owner)
+    assert client.post("/vote", json={"book_id": book_id, "dir": 1}, headers=voter).status_code == 200
+    assert client.get(f"/books/{book_id}").status_code == 200
+
+    assert client.delete(f"/books/{book_id}", headers=owner).status_code == 200
+
+    assert client.get(f"/books/{book_id}").status_code == 404
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.vote).where(models.vote.book_id == book_id)).scalar() == 0
+    stats = client.get(f"/users/{owner_id}/stats").json()
+    assert stats["books"] == 0
+    assert stats["votes_received"] == 0
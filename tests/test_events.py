@@ -0,0 +1,15 @@
+import json
+from app.events import VoteFeed
+
+
+def test_old_books_are_forgotten():
+    feed = VoteFeed(max_rate=1000, buffer_size=4)
+    feed.min_interval = 0
+    for book_id in range(1, 11):
+        feed.receive(json.dumps([[book_id, book_id, book_id]]))
+    assert [event_id for event_id, _ in feed.events] == [7, 8, 9, 10]
+    assert set(feed._latest) <= set(range(5, 11))
+    assert len(feed._last_emit) < 10
+    # A change older than one still tracked is dropped
+    feed.receive(json.dumps([[10, 0, 9]]))
+    assert feed.events[-1][0] == 10
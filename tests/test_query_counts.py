@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import event, insert
+
+from app import models, oauth2, schemas
+from app.config import settings
+from app.database import SessionLocal, async_engine, engine
+from app.rendering import renderer
+from app.routers import Book, pages
+
+PAGE_SIZES = [1, 25]
+
+
+@pytest.fixture(scope="module")
+def owners():
+    # Owner n has n books, so every listing below returns a full page of n books
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        ids = db.scalars(insert(models.users).returning(models.users.id), [
+            {"name": f"querycount{size}", "email": f"querycount{size}@example.com", "password": "x"} for size in PAGE_SIZES
+        ]).all()
+        owners = dict(zip(PAGE_SIZES, ids))
+        db.execute(insert(models.Book), [
+            {"Title": f"Book {size}.{b}", "Author": "Author", "Owners_id": owners[size]} for size in PAGE_SIZES for b in range(size)
+        ])
+        db.commit()
+    return owners
+
+
+def count_statements(method, path, user_id, params=None):
+    # Runs the routers without the lifespan, so no background task adds statements;
+    # only statements issued on this thread's event loop are counted
+    app = FastAPI()
+    app.include_router(Book.app)
+    app.include_router(pages.app)
+    app.dependency_overrides[oauth2.get_current_user] = lambda: schemas.TokenData(id=user_id)
+    statements = []
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    async def request():
+        # Pooled connections belong to whichever event loop opened them
+        await async_engine.dispose()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.request(method, path, params=params)
+            response.raise_for_status()
+        await async_engine.dispose()
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        asyncio.run(request())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+
+@pytest.mark.parametrize("size", PAGE_SIZES)
+def test_sqlalchemy_is_one_statement(owners, size):
+    assert count_statements("GET", "/sqlalchemy", owners[size]) == 1
+
+
+@pytest.mark.parametrize("size", PAGE_SIZES)
+def test_book_listing_is_one_statement(owners, size):
+    assert count_statements("POST", "/", owners[size], {"limit": size, "owner_id": owners[size]}) == 1
+
+
+@pytest.mark.parametrize("size", PAGE_SIZES)
+def test_books_page_is_one_statement(owners, size, monkeypatch):
+    monkeypatch.setattr(settings, "books_page_size", size)
+    renderer.prepare()
+    renderer.invalidate_books()
+    assert count_statements("GET", "/books", owners[size]) == 1
+    renderer.invalidate_books()
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from app import replicas
+from app.config import settings
+from app.hub import Hub
+from app.replicas import ReplicaSet
+
+URLS = ["sqlite:///./replica-a.db", "sqlite:///./replica-b.db", "sqlite:///./replica-c.db"]
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        ReplicaSet(URLS, strategy="random")
+
+
+def test_round_robin_skips_ejected():
+    replica_set = ReplicaSet(URLS)
+    a, b, c = replica_set.replicas
+    assert [replica_set.choose() for _ in range(6)] == [a, b, c, a, b, c]
+    replica_set.eject(b, "down")
+    assert {replica_set.choose() for _ in range(4)} == {a, c}
+    replica_set.eject(a, "down")
+    replica_set.eject(c, "down")
+    assert replica_set.choose() is None
+
+
+def test_least_connections():
+    replica_set = ReplicaSet(URLS, strategy="least_connections")
+    a, b, c = replica_set.replicas
+    a.in_flight, b.in_flight, c.in_flight = 3, 1, 2
+    assert replica_set.choose() is b
+    replica_set.eject(b, "down")
+    assert replica_set.choose() is c
+
+
+def test_eject_logs_once(caplog):
+    replica_set = ReplicaSet(URLS[:1])
+    replica = replica_set.replicas[0]
+    replica_set.eject(replica, "down")
+    replica_set.eject(replica, "still down")
+    assert not replica.healthy
+    assert len([record for record in caplog.records if "Ejecting" in record.message]) == 1
+
+
+def test_check_ejects_lagging_and_restores(monkeypatch):
+    replica_set = ReplicaSet(URLS[:1])
+    replica = replica_set.replicas[0]
+    lag = settings.replica_max_lag + 1
+
+    async def probe(_):
+        return lag
+
+    monkeypatch.setattr(replica_set, "_probe", probe)
+    asyncio.run(replica_set.check(replica))
+    assert not replica.healthy
+    lag = 0.0
+    asyncio.run(replica_set.check(replica))
+    assert replica.healthy
+
+
+def test_wrote_recently(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replicas.time, "monotonic", lambda: now[0])
+    replica_set = ReplicaSet(URLS[:1], read_your_writes=5.0)
+    replica_set.mark_write(b"alice")
+    assert replica_set.wrote_recently(b"alice")
+    assert not replica_set.wrote_recently(b"bob")
+    assert not replica_set.wrote_recently(None)
+    now[0] += 5.0
+    assert not replica_set.wrote_recently(b"alice")
+
+
+def test_mark_write_expires_and_bounds_writers(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replicas.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(replicas, "MAX_TRACKED_WRITERS", 2)
+    replica_set = ReplicaSet(URLS[:1], read_your_writes=5.0)
+    replica_set.mark_write(b"a")
+    now[0] += 10
+    replica_set.mark_write(b"b")
+    assert list(replica_set._writers) == [b"b"]
+    replica_set.mark_write(b"c")
+    replica_set.mark_write(b"d")
+    assert list(replica_set._writers) == [b"c", b"d"]
+
+
+def test_without_replicas_writes_are_not_tracked():
+    replica_set = ReplicaSet([])
+    replica_set.mark_write(b"alice")
+    assert not replica_set.wrote_recently(b"alice")
+    assert replica_set.choose() is None
+
+
+def test_writes_are_shared_between_workers(shared_broker):
+    async def scenario():
+        broker = shared_broker
+        workers = []
+        for _ in range(2):
+            hub = Hub(broker, 8)
+            await hub.start()
+            replica_set = ReplicaSet(URLS[:1])
+            replica_set.attach(hub)
+            workers.append(replica_set)
+        first, second = workers
+        first.mark_write(b"alice")
+        assert first.wrote_recently(b"alice")
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return second.wrote_recently(b"alice"), second.wrote_recently(b"bob")
+
+    assert asyncio.run(scenario()) == (True, False)
@@ -0,0 +1,148 @@
+# A rolling restart drops nothing: app.serve runs several workers while clients read,
+# vote and import books, SIGHUP replaces every worker, and afterwards every request
+# has succeeded, every accepted import is fully written and every vote is counted.
+# Set TEST_SERVE_DATABASE_URL to run it against Postgres instead of a SQLite file.
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, func, select
+from app import models
+
+pytestmark = pytest.mark.slow
+
+WORKERS = 2
+IMPORT_ROWS = 200
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+class Traffic:
+    def __init__(self, url: str):
+        self.url = url
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.ok = {"read": 0, "vote": 0, "import": 0}
+        self.failures = []
+        self.imported = 0
+
+    def record(self, kind: str, response):
+        with self.lock:
+            if isinstance(response, Exception) or response.status_code >= 500:
+                self.failures.append((kind, repr(response) if isinstance(response, Exception) else response.status_code))
+            else:
+                self.ok[kind] += 1
+
+    @staticmethod
+    def client(headers=None):
+        # One connection per request: a draining worker closes idle keep-alive
+        # connections, and a request racing that close is reset before it is read.
+        # HTTP/1.1 clients retry those, so they are not what this test measures.
+        return httpx.Client(timeout=30, headers={**(headers or {}), "Connection": "close"})
+
+    def request(self, http, kind, method, path, **kwargs):
+        try:
+            response = http.request(method, self.url + path, **kwargs)
+        except httpx.HTTPError as e:
+            response = e
+        self.record(kind, response)
+        return response
+
+    def reader(self, book_ids):
+        with self.client() as http:
+            while not self.stop.is_set():
+                for book_id in book_ids:
+                    self.request(http, "read", "GET", f"/books/{book_id}")
+
+    def voter(self, headers, book_ids):
+        # Toggles its votes so every round writes
+        with self.client(headers) as http:
+            direction = 1
+            while not self.stop.is_set():
+                for book_id in book_ids:
+                    self.request(http, "vote", "POST", "/vote", json={"book_id": book_id, "dir": direction})
+                direction = 1 - direction
+
+    def importer(self, headers):
+        body = "".join(json.dumps({"Title": f"Imported {i}", "Author": "Bulk", "published": True}) + "\n"
+                       for i in range(IMPORT_ROWS))
+        with self.client({**headers, "Content-Type": "application/x-ndjson"}) as http:
+            while not self.stop.is_set():
+                response = self.request(http, "import", "POST", "/books/import", content=body)
+                if not isinstance(response, Exception) and response.status_code == 202:
+                    with self.lock:
+                        self.imported += IMPORT_ROWS
+                time.sleep(0.2)
+
+
+def test_rolling_restart_drops_nothing(tmp_path):
+    database_url = os.environ.get("TEST_SERVE_DATABASE_URL") or f"sqlite:///{tmp_path / 'serve.db'}"
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(engine)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, "-m", "app.serve"],
+                              env={**os.environ, "DATABASE_URL": database_url, "WORKERS": str(WORKERS),
+                                   "HOST": "127.0.0.1", "PORT": str(port), "GRACEFUL_TIMEOUT": "10",
+                                   "RATE_LIMIT_ENABLED": "false"})
+    traffic = Traffic(url)
+    try:
+        wait_until_up(url + "/login")
+        sessions = []
+        for i in range(3):
+            email = f"rolling{i}@example.com"
+            httpx.post(url + "/register", json={"name": f"rolling{i}", "email": email, "password": "secret"}).raise_for_status()
+            token = httpx.post(url + "/login_new", data={"username": email, "password": "secret"}).json()["access_token"]
+            sessions.append({"Authorization": f"Bearer {token}"})
+        book_ids = [httpx.post(url + "/create_new_book", json={"Title": f"Book {i}", "Author": "Rolling", "published": True},
+                               headers=sessions[0]).json()["id"] for i in range(4)]
+
+        threads = [threading.Thread(target=traffic.reader, args=(book_ids,)) for _ in range(2)]
+        threads += [threading.Thread(target=traffic.voter, args=(headers, book_ids)) for headers in sessions[1:]]
+        threads.append(threading.Thread(target=traffic.importer, args=(sessions[0],)))
+        for thread in threads:
+            thread.start()
+        time.sleep(2)
+        server.send_signal(signal.SIGHUP)
+        # Each replacement warms up before its predecessor drains
+        time.sleep(6 * WORKERS)
+        traffic.stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        traffic.stop.set()
+        server.send_signal(signal.SIGTERM)
+        server.wait(60)
+
+    assert traffic.failures == []
+    assert all(traffic.ok.values()), traffic.ok
+    with engine.connect() as conn:
+        # Imports accepted before a drain were finished by the worker that accepted them
+        imported = conn.execute(select(func.count()).select_from(models.Book).where(models.Book.Author == "Bulk")).scalar()
+        assert imported == traffic.imported
+        # Vote deltas still pending in a draining worker were flushed
+        counted = select(func.count()).where(models.vote.book_id == models.Book.id).scalar_subquery()
+        rows = conn.execute(select(models.Book.id, models.Book.vote_count, counted).where(models.Book.id.in_(book_ids))).all()
+        assert all(vote_count == votes for _, vote_count, votes in rows), rows
@@ -0,0 +1,29 @@
+import asyncio
+from app.hub import Hub
+from app.search import InvertedIndex
+
+
+def test_index_writes_are_shared_between_workers(shared_broker):
+    async def scenario():
+        workers = []
+        for _ in range(2):
+            hub = Hub(shared_broker, 8)
+            await hub.start()
+            index = InvertedIndex()
+            index.enabled = True
+            index.start(hub)
+            workers.append(index)
+        first, second = workers
+        first.add(1, "Dune", "Frank Herbert")
+        first.add(2, "Dune Messiah", "Frank Herbert")
+        for _ in range(3):
+            await asyncio.sleep(0)
+        found = second.search("dune", 10, 0)
+        first.remove(1)
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return found, first.search("dune", 10, 0), second.search("dune", 10, 0)
+
+    found, first, second = asyncio.run(scenario())
+    assert sorted(book_id for book_id, _ in found) == [1, 2]
+    assert first == second == [(2, 2)]
@@ -0,0 +1,15 @@
+def test_signup_form_shows_in_user_list(client):
+    before = client.get("/users").json()
+    response = client.post("/signup", data={"username": "formuser@example.com", "password": "secret"}, follow_redirects=False)
+    assert response.status_code == 303
+    emails = [user["email"] for user in client.get("/users").json()]
+    assert len(emails) == len(before) + 1 and "formuser@example.com" in emails
+
+
+def test_user_export_leaves_out_emails(client, login):
+    _, headers = login()
+    response = client.get("/export/users", headers=headers)
+    assert response.status_code == 200
+    header, *rows = response.text.splitlines()
+    assert header.split(",") == ["id", "name", "created_at"]
+    assert rows and "@" not in response.text